@@ -0,0 +1,264 @@
+import numpy as np
+
+from cache import LRUCache
+
+# 聚合索引缓存的字节预算
+AGGREGATE_CACHE_BYTES = 256 * 2**20
+# 区间最值使用的分块大小
+BLOCK_SIZE = 1024
+# 选中的行超过该数量的连续区间时, 直接取出选中的单元格计算
+MAX_RUNS = 64
+
+# 列聚合索引缓存: (数据版本, 列名) -> ColumnAggregates
+# 以版本号为键要求同一版本的数据不变: 索引只使用自己的副本 (或只读内存映射), 其数组均设为只读
+_aggregate_cache = LRUCache(max_entries=None, max_bytes=AGGREGATE_CACHE_BYTES, sizeof=lambda agg: agg.nbytes)
+
+
+def _prefix(values):
+    out = np.empty(len(values) + 1, dtype=values.dtype)
+    out[0] = 0
+    np.cumsum(values, out=out[1:])
+    return out
+
+
+def _mapped_read_only(values):
+    # 数组是否 (经由视图) 指向只读内存映射
+    while isinstance(values, np.ndarray):
+        if isinstance(values, np.memmap):
+            return values.mode == 'r'
+        values = values.base
+    return False
+
+
+class ColumnAggregates:
+    # 单列的聚合索引, 任意连续行区间的计数/求和/方差 O(1), 最值 O(区间/分块 + 分块)
+    #   prefix_null: 缺失值个数的前缀和 (无缺失值时为 None)
+    #   prefix_sum / prefix_sq: 平移 shift 后取值及其平方的前缀和, 平移到列均值附近以减小相减时的舍入误差
+    #   block_min / block_max: 每 BLOCK_SIZE 行的最值
+    # 含 ±inf 的列无法使用前缀和, 区间统计直接在该区间上计算
+    # 数据表的列会被编辑器原地修改, 而撤销/重做会回到旧版本号, 因此 values 保存列的副本,
+    # 使缓存中的索引始终对应建立时的数据; 只有只读内存映射的列 (数据集存储) 不会被修改, 直接引用
+    # 排好序的有效值在首次求中位数时生成, 生成后由 cache_key 更新缓存中记录的占用
+    def __init__(self, series, cache_key=None):
+        self.n = len(series)
+        self.cache_key = cache_key
+        null = series.isna().to_numpy()
+        self.null_count = int(null.sum())
+        self.prefix_null = _prefix(null.astype(np.int64)) if self.null_count else None
+        if self.prefix_null is not None:
+            self._freeze('prefix_null')
+        self.numeric = False
+        self.values = None
+        self._owns_values = False
+        self._sorted = None
+        if series.dtype.kind not in 'iuf':
+            return
+
+        self.numeric = True
+        if isinstance(series.dtype, np.dtype):
+            values = series.to_numpy()
+            if not _mapped_read_only(values):
+                values = values.copy()
+                self._owns_values = True
+        else:
+            values = series.to_numpy(dtype=float, na_value=np.nan)
+            self._owns_values = True
+        values.flags.writeable = False
+        self.values = values
+        finite = values[np.isfinite(values)]
+        self.exact = len(finite) == self.n - self.null_count
+        if not self.exact:
+            return
+        # float32/整数列按 float64 累加
+        self.shift = float(finite.mean(dtype=float)) if len(finite) else 0.0
+        shifted = np.nan_to_num(np.subtract(values, self.shift, dtype=float), nan=0.0)
+        self.prefix_sum = _prefix(shifted)
+        self.prefix_sq = _prefix(shifted * shifted)
+        blocks = -(-self.n // BLOCK_SIZE)
+        padded = np.full(blocks * BLOCK_SIZE, np.nan)
+        padded[:self.n] = values
+        padded = padded.reshape(blocks, BLOCK_SIZE)
+        with np.errstate(invalid='ignore'):
+            self.block_min = np.fmin.reduce(padded, axis=1)
+            self.block_max = np.fmax.reduce(padded, axis=1)
+        self._freeze('prefix_sum', 'prefix_sq', 'block_min', 'block_max')
+
+    def _freeze(self, *names):
+        for name in names:
+            getattr(self, name).flags.writeable = False
+
+    @property
+    def nbytes(self):
+        # 只计入索引自身持有的数组, 引用的内存映射列不计
+        size = self.values.nbytes if self._owns_values else 0
+        for name in ('prefix_null', '_sorted', 'prefix_sum', 'prefix_sq', 'block_min', 'block_max'):
+            arr = getattr(self, name, None)
+            if arr is not None:
+                size += arr.nbytes
+        return size
+
+    def nulls(self, start, stop):
+        if self.prefix_null is None:
+            return 0
+        return int(self.prefix_null[stop] - self.prefix_null[start])
+
+    def sorted_values(self):
+        if self._sorted is None:
+            values = self.values
+            self._sorted = np.sort(values[~np.isnan(values)])
+            self._freeze('_sorted')
+            # 占用变大, 重新放入缓存以更新字节数 (已被淘汰时不再放回)
+            if self.cache_key is not None and self.cache_key in _aggregate_cache:
+                _aggregate_cache.put(self.cache_key, self)
+        return self._sorted
+
+    def _range_extreme(self, start, stop, blocks, reduce):
+        first = -(-start // BLOCK_SIZE)
+        last = stop // BLOCK_SIZE
+        if first >= last:
+            return reduce.reduce(self.values[start:stop])
+        parts = [blocks[first:last], self.values[start:first * BLOCK_SIZE], self.values[last * BLOCK_SIZE:stop]]
+        return reduce.reduce(np.concatenate(parts))
+
+    def range_moments(self, start, stop):
+        # 区间 [start, stop) 的 (有效值个数, 和, 离差平方和, 最小值, 最大值)
+        if not self.exact:
+            return _moments(self.values[start:stop])
+        count = (stop - start) - self.nulls(start, stop)
+        if count == 0:
+            return 0, 0.0, 0.0, np.nan, np.nan
+        s = self.prefix_sum[stop] - self.prefix_sum[start]
+        q = self.prefix_sq[stop] - self.prefix_sq[start]
+        m2 = max(q - s * s / count, 0.0)
+        with np.errstate(invalid='ignore'):
+            low = self._range_extreme(start, stop, self.block_min, np.fmin)
+            high = self._range_extreme(start, stop, self.block_max, np.fmax)
+        return count, count * self.shift + s, m2, low, high
+
+
+def _moments(values):
+    values = np.asarray(values, dtype=float)
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return 0, 0.0, 0.0, np.nan, np.nan
+    with np.errstate(invalid='ignore'):
+        return len(values), values.sum(), np.var(values) * len(values), values.min(), values.max()
+
+
+def column_aggregates(df, col, data_version):
+    key = (data_version, col)
+    agg = _aggregate_cache.get(key)
+    if agg is None:
+        agg = ColumnAggregates(df[col], key)
+        _aggregate_cache.put(key, agg)
+    return agg
+
+
+def row_runs(rows, total_rows, max_runs=MAX_RUNS):
+    # 有序行位置 -> 连续区间列表 [(start, stop)], rows 为 None 表示全部行; 区间多于 max_runs 时返回 None
+    if rows is None:
+        return [(0, total_rows)]
+    if not len(rows):
+        return []
+    breaks = np.flatnonzero(np.diff(rows) != 1) + 1
+    if len(breaks) >= max_runs:
+        return None
+    starts = rows[np.concatenate([[0], breaks])]
+    stops = rows[np.concatenate([breaks - 1, [len(rows) - 1]])] + 1
+    return list(zip(starts.tolist(), stops.tolist()))
+
+
+def kth_smallest(arrays, k):
+    # 多个已排序数组合并后的第 k 小 (从 0 开始) 元素, 不实际合并
+    # 每轮以窗口最大的数组的中位元素为枢轴, 按 searchsorted 计数缩小各数组的窗口
+    lo = np.zeros(len(arrays), dtype=np.int64)
+    hi = np.array([len(a) for a in arrays], dtype=np.int64)
+    while True:
+        i = int(np.argmax(hi - lo))
+        pivot = arrays[i][(lo[i] + hi[i]) // 2]
+        less = np.array([np.clip(np.searchsorted(a, pivot, 'left'), l, h) for a, l, h in zip(arrays, lo, hi)])
+        less_equal = np.array([np.clip(np.searchsorted(a, pivot, 'right'), l, h) for a, l, h in zip(arrays, lo, hi)])
+        count_less = int((less - lo).sum())
+        count_equal = int((less_equal - less).sum())
+        if k < count_less:
+            hi = less
+        elif k < count_less + count_equal:
+            return pivot
+        else:
+            k -= count_less + count_equal
+            lo = less_equal
+
+
+def _median(aggs, rows, runs):
+    if rows is None:
+        arrays = [agg.sorted_values() for agg in aggs]
+        arrays = [a for a in arrays if len(a)]
+        total = sum(len(a) for a in arrays)
+        if total % 2:
+            return kth_smallest(arrays, total // 2)
+        return (kth_smallest(arrays, total // 2 - 1) + kth_smallest(arrays, total // 2)) / 2
+    # 部分行: 只取出选中单元格中的数值
+    if runs is not None:
+        values = np.concatenate([agg.values[start:stop] for agg in aggs for start, stop in runs])
+    else:
+        values = np.concatenate([agg.values[rows] for agg in aggs])
+    values = values.astype(float, copy=False)
+    return np.median(values[~np.isnan(values)])
+
+
+def _count_nulls(aggs, rows, runs):
+    if runs is not None:
+        return sum(agg.nulls(start, stop) for agg in aggs for start, stop in runs)
+    # 第 r 行的缺失值个数 = prefix_null[r + 1] - prefix_null[r]
+    return sum(int((agg.prefix_null[rows + 1] - agg.prefix_null[rows]).sum())
+               for agg in aggs if agg.prefix_null is not None)
+
+
+def selection_stats(df, rows=None, cols=None, data_version=None):
+    # 选区统计, 与对选区展开后的数值逐个计算的结果一致
+    # rows 为行位置列表 (None 为全部行), cols 为列名列表 (None 为全部列)
+    total_rows = len(df)
+    cols = df.columns.tolist() if cols is None else list(cols)
+    if rows is not None:
+        # 行号排序去重 (选中的行通常已经有序)
+        rows = np.asarray(rows, dtype=np.int64)
+        if len(rows) > 1 and not np.all(rows[1:] > rows[:-1]):
+            rows = np.sort(rows)
+            rows = rows[np.concatenate([[True], rows[1:] != rows[:-1]])]
+    runs = row_runs(rows, total_rows)
+    n_rows = total_rows if rows is None else len(rows)
+    aggs = [column_aggregates(df, col, data_version) for col in cols]
+    numeric = [agg for agg in aggs if agg.numeric]
+
+    stats = {
+        'rows': n_rows,
+        'cols': len(cols),
+        'items': n_rows * len(cols),
+        'empty': _count_nulls(aggs, rows, runs),
+        'count': 0
+    }
+
+    # 各区间的矩按并行公式 (Chan 等) 合并
+    if runs is not None:
+        parts = [agg.range_moments(start, stop) for agg in numeric for start, stop in runs]
+    else:
+        parts = [_moments(agg.values[rows]) for agg in numeric]
+    parts = [p for p in parts if p[0]]
+    if not parts:
+        return stats
+    counts = np.array([p[0] for p in parts], dtype=float)
+    sums = np.array([p[1] for p in parts])
+    count = counts.sum()
+    mean = sums.sum() / count
+    with np.errstate(invalid='ignore'):
+        m2 = sum(p[2] for p in parts) + (counts * (sums / counts - mean) ** 2).sum()
+    stats.update({
+        'count': int(count),
+        'sum': sums.sum(),
+        'mean': mean,
+        'median': _median(numeric, rows, runs),
+        'var': m2 / count,
+        'min': min(p[3] for p in parts),
+        'max': max(p[4] for p in parts)
+    })
+    return stats
@@ -1,9 +1,24 @@
+import uuid
 import streamlit as st
 import pandas as pd
-import matplotlib.pyplot as plt
+import matplotlib.style
 import numpy as np
-from plot_type import draw_plot_content
-from code_generator import generate_plot_code
+from aggregates import selection_stats
+from code_generator import (DATA_FILE_MIMES, DATA_FILE_NAMES, DATA_FORMATS, INLINE_MAX_ROWS, export_plot_data,
+                            generate_plot_code, parquet_available, plot_data_columns)
+from correlation import ANNOTATION_BUDGET, HEATMAP_ORDERS, update_correlation_rows
+from data_loader import is_csv, list_excel_sheets, load_uploaded_file
+from dataset import VersionedDataset
+from decimation import DECIMATION_METHODS
+from histogram import BASE_BINS
+from interactive import INTERACTIVE_PLOT_TYPES, interactive_payload, vega_lite_spec
+from peaks import peak_table
+from plot_spec import PLOT_TYPES, PlotSpec
+from regression import regression_table
+from figures import figure_stats
+from render_pool import get_render_pool
+from renderer import PREVIEW_DPI, PROGRESSIVE_ROWS, cached_draft, cached_render, peek_render, render_cache_stats
+from table_editor import PAGE_SIZES, page_bounds
 
 # 设置页面配置
 st.set_page_config(
@@ -46,7 +61,7 @@ st.markdown("""
     """, unsafe_allow_html=True)
 
 # 初始化Session State
-if 'df' not in st.session_state:
+if 'dataset' not in st.session_state:
     # 生成一些默认的示例数据
     data = {
         'Time (s)': np.linspace(0, 10, 20),
@@ -54,7 +69,13 @@ if 'df' not in st.session_state:
         'Current (A)': np.cos(np.linspace(0, 10, 20)) * 0.5 + np.random.normal(0, 0.05, 20),
         'Temperature (C)': np.linspace(20, 100, 20) + np.random.normal(0, 2, 20)
     }
-    st.session_state.df = pd.DataFrame(data)
+    # 带版本的数据表: 版本号在数据每次变化时更新, 作为渲染等缓存的键 (上传文件的初始版本为数据集ID, 以便会话间共享)
+    st.session_state.dataset = VersionedDataset(pd.DataFrame(data))
+    st.session_state.dataset_id = None
+
+# 会话标识, 用于在后台渲染时取消同一会话中过期的任务
+if 'session_token' not in st.session_state:
+    st.session_state.session_token = uuid.uuid4().hex
 
 # 侧边栏 - 控制面板
 with st.sidebar:
@@ -65,14 +86,40 @@ with st.sidebar:
         # 新增：编码选择，解决中文乱码问题
         encoding = st.selectbox("文件编码 (仅CSV有效)", ["utf-8", "gbk", "gb18030", "cp936", "latin1"], index=0)
         
+        streaming = st.checkbox("流式导入 (仅CSV有效)", False, help="分块读取大文件并自动压缩数据类型 (float32/整数降位/category), 降低内存占用")
+        
         uploaded_file = st.file_uploader("导入 CSV/Excel", type=['csv', 'xlsx'])
         if uploaded_file is not None:
             try:
-                if uploaded_file.name.endswith('.csv'):
-                    st.session_state.df = pd.read_csv(uploaded_file, encoding=encoding)
-                else:
-                    st.session_state.df = pd.read_excel(uploaded_file)
+                sheet_name = 0
+                if not is_csv(uploaded_file.name):
+                    sheet_name = st.selectbox("工作表", list_excel_sheets(uploaded_file), index=0)
+                
+                # 仅在新文件 (或编码/工作表/导入模式变化) 时才解析并替换数据, 避免每次重跑覆盖用户的编辑
+                upload_key = (uploaded_file.file_id, encoding, sheet_name, streaming)
+                if st.session_state.get('upload_key') != upload_key:
+                    progress_bar = st.progress(0.0, text="正在导入...")
+                    def on_progress(fraction, rows):
+                        progress_bar.progress(fraction, text=f"正在导入... 已读取 {rows} 行")
+                    
+                    # 上传的数据集被转换为列式内存映射存储, 多个会话打开同一文件时共享页缓存
+                    st.session_state.dataset_id, df, st.session_state.import_report = load_uploaded_file(
+                        uploaded_file, encoding=encoding, sheet_name=sheet_name,
+                        streaming=streaming, progress_callback=on_progress
+                    )
+                    # 数据集缓存中的表与其他会话共享, 首次编辑前浅拷贝
+                    st.session_state.dataset = VersionedDataset(df, base_version=st.session_state.dataset_id, shared=True)
+                    st.session_state.upload_key = upload_key
+                    progress_bar.empty()
                 st.success("数据加载成功!")
+                
+                if st.session_state.dataset_id is not None:
+                    st.caption(f"数据集 ID: `{st.session_state.dataset_id}` (可用于渲染服务)")
+                report = st.session_state.get('import_report')
+                if report:
+                    saved = report['original_bytes'] - report['compact_bytes']
+                    ratio = saved / report['original_bytes'] if report['original_bytes'] else 0
+                    st.caption(f"内存占用: {report['original_bytes'] / 2**20:.1f} MB → {report['compact_bytes'] / 2**20:.1f} MB (节省 {ratio:.0%})")
             except Exception as e:
                 st.error(f"加载失败: {e}")
         
@@ -83,44 +130,38 @@ with st.sidebar:
                 'Current (A)': np.cos(np.linspace(0, 10, 20)) * 0.5 + np.random.normal(0, 0.05, 20),
                 'Temperature (C)': np.linspace(20, 100, 20) + np.random.normal(0, 2, 20)
             }
-            st.session_state.df = pd.DataFrame(data)
+            st.session_state.dataset = VersionedDataset(pd.DataFrame(data))
+            st.session_state.dataset_id = None
             st.rerun()
 
     # 2. 基础绘图设置 (保持展开)
     with st.expander("基础设置", expanded=True):
-        plot_type = st.selectbox(
-            "图表类型",
-            [
-                "Line Plot (折线图)", 
-                "Scatter Plot (散点图)", 
-                "Bar Chart (柱状图)", 
-                "Histogram (直方图)", 
-                "Box Plot (箱线图)", 
-                "Pie Chart (饼图)",
-                "Area Chart (面积图)",
-                "Violin Plot (小提琴图)",
-                "Correlation Heatmap (相关性热力图)"
-            ],
-            index=0
-        )
+        plot_type = st.selectbox("图表类型", PLOT_TYPES, index=0)
         
         # 根据图表类型动态显示列选择
-        cols = st.session_state.df.columns.tolist()
+        cols = st.session_state.dataset.frame.columns.tolist()
         
         # 初始化变量以避免 UnboundLocalError
         bins = 20
+        hist_base = False
         legend_loc = 'best'
         interp_kind = 'linear'
         interp_factor = 5
         peak_prominence = 0.1
         peak_width = 0.0
         extra_axes = []
+        heatmap_order = 'original'
+        heatmap_top_k = 20
+        heatmap_annot_threshold = 0.0
+        heatmap_annot_budget = ANNOTATION_BUDGET
         
         match plot_type:
             case "Histogram (直方图)":
                 x_col = st.selectbox("目标数据列", cols, index=1)
                 y_cols = [] # 直方图不需要Y轴选择
                 bins = st.slider("分箱数量 (Bins)", 5, 100, 20)
+                hist_base = st.checkbox("细粒度预分箱", False,
+                    help=f"先按 {BASE_BINS} 个分箱统计一次, 分箱数能整除它时直接合并, 拖动滑块无需重新扫描数据; 恰好落在分箱边界上的浮点值可能归入相邻分箱")
             case "Pie Chart (饼图)":
                 x_col = st.selectbox("分类标签列 (Labels)", cols, index=0)
                 y_col_pie = st.selectbox("数值列 (Values)", cols, index=1)
@@ -132,6 +173,16 @@ with st.sidebar:
                 x_col = None
                 y_cols = []
                 st.info("热力图将自动计算所有数值列的相关性矩阵。")
+                heatmap_order = st.selectbox("列排序", HEATMAP_ORDERS,
+                    format_func=lambda m: {'original': '原始顺序', 'clustered': '层次聚类', 'top-k': '相关性最强的前 k 列'}[m])
+                if heatmap_order == 'top-k':
+                    heatmap_top_k = st.number_input("k", 3, 500, 20)
+                col_annot_threshold, col_annot_budget = st.columns(2)
+                with col_annot_threshold:
+                    heatmap_annot_threshold = st.slider("标注阈值 |r|", 0.0, 1.0, 0.0, 0.05)
+                with col_annot_budget:
+                    heatmap_annot_budget = st.number_input("最多标注格数", 0, 10_000, ANNOTATION_BUDGET, step=100,
+                                                           help="格子小于数值文字时不标注 (与图片尺寸和字号有关)")
             case _ :
                 x_col = st.selectbox("X 轴数据", cols, index=0)
                 y_cols = st.multiselect("Y 轴数据 (可多选)", cols, default=[cols[1]] if len(cols) > 1 else [])
@@ -185,7 +236,7 @@ with st.sidebar:
                 
                 alpha = st.slider("不透明度 (Alpha)", 0.1, 1.0, 0.8)
             
-            theme_style = st.selectbox("Matplotlib 风格", plt.style.available, index=plt.style.available.index('seaborn-v0_8-whitegrid') if 'seaborn-v0_8-whitegrid' in plt.style.available else 0)
+            theme_style = st.selectbox("Matplotlib 风格", matplotlib.style.available, index=matplotlib.style.available.index('seaborn-v0_8-whitegrid') if 'seaborn-v0_8-whitegrid' in matplotlib.style.available else 0)
 
         # --- Tab 2: 坐标轴设置 ---
         with cfg_tab2:
@@ -274,6 +325,25 @@ with st.sidebar:
                 
             dpi = st.slider("分辨率 (DPI)", 72, 1000, 100)
             
+            col_dec, col_dec_method = st.columns(2)
+            with col_dec:
+                enable_decimation = st.checkbox("折线图自动降采样", True, help="数据点远多于图片像素宽度时, 按像素降采样后再绘制, 保留每个像素内的峰值")
+            with col_dec_method:
+                decimation_method = st.selectbox("降采样方法", DECIMATION_METHODS, index=0, disabled=not enable_decimation)
+            
+            col_density, col_density_threshold = st.columns(2)
+            with col_density:
+                enable_density = st.checkbox("散点图密度模式", True, help="点数超过阈值时, 将散点按二维网格计数后绘制为一张密度图像")
+            with col_density_threshold:
+                density_threshold = st.number_input("密度模式阈值 (点)", 1000, 100_000_000, 100_000, step=10_000, disabled=not enable_density)
+            
+            st.markdown("---")
+            use_render_pool = st.checkbox("后台进程渲染", False, help="在独立的工作进程中渲染, 参数变化时自动取消未完成的渲染, 避免高DPI或大数据阻塞页面")
+            progressive_render = st.checkbox("渐进式渲染", True, help=f"超过 {PROGRESSIVE_ROWS:,} 行时先显示抽样的低分辨率草图, 完整图片在后台进程中渲染完成后替换; 参数变化时放弃未完成的渲染")
+            render_timeout = 60
+            if use_render_pool or progressive_render:
+                render_timeout = st.number_input("渲染超时 (秒)", 5, 600, 60)
+            
             st.markdown("---")
             custom_rc = st.text_area("自定义 (JSON)", placeholder='{"lines.linewidth": 2, "axes.grid": true}')
 
@@ -311,14 +381,56 @@ with st.sidebar:
                 show_linreg_p_value = st.checkbox("显示显著性水平", False)
                 show_linreg_str_err = st.checkbox("显示标准误差", False)
 
+# 汇总全部绘图参数, 作为渲染缓存键的一部分
+plot_spec = PlotSpec(**{
+    'plot_type': plot_type, 'x_col': x_col, 'y_cols': y_cols,
+    'marker_style_val': marker_style_val, 'line_style_val': line_style_val,
+    'line_width': line_width, 'marker_size': marker_size, 'alpha': alpha, 'font_size': font_size,
+    'bins': bins, 'hist_base': hist_base,
+    'enable_interp': enable_interp, 'interp_kind': interp_kind, 'interp_factor': interp_factor,
+    'enable_peaks': enable_peaks, 'peak_prominence': peak_prominence, 'peak_width': peak_width,
+    'enable_linreg': enable_linreg, 'show_linreg_eq': show_linreg_eq, 'show_linreg_r2': show_linreg_r2,
+    'show_linreg_p_value': show_linreg_p_value, 'show_linreg_str_err': show_linreg_str_err,
+    'extra_axes': extra_axes,
+    'enable_decimation': enable_decimation, 'decimation_method': decimation_method,
+    'enable_density': enable_density, 'density_threshold': density_threshold,
+    'heatmap_order': heatmap_order, 'heatmap_top_k': heatmap_top_k,
+    'heatmap_annot_threshold': heatmap_annot_threshold, 'heatmap_annot_budget': heatmap_annot_budget,
+    'plot_title': plot_title, 'x_label': x_label, 'y_label': y_label,
+    'show_grid': show_grid, 'show_legend': show_legend, 'legend_loc': legend_loc,
+    'log_x': log_x, 'log_y': log_y, 'invert_x': invert_x, 'invert_y': invert_y,
+    'x_min': x_min, 'x_max': x_max, 'y_min': y_min, 'y_max': y_max,
+    'theme_style': theme_style, 'font_family': font_family,
+    'fig_width': fig_width, 'fig_height': fig_height, 'dpi': dpi, 'custom_rc': custom_rc
+})
+
 # 主界面
 st.markdown("一个输入数据并绘图的简单工具, *几乎只能*用于作二维曲线图, 绘图基于[Matplotlib](https://matplotlib.org/), 也包括了一些`NumPy`和`SciPy`的简单数据处理功能。")
 st.markdown("[Repository](https://github.com/alkali210/simple-plt-webui)")
 
-# 使用 Tabs 分离数据视图和绘图视图
-tab1, tab2, tab3 = st.tabs(["数据表", "绘图预览", "展示代码"])
+# 三个标签页各自是一个 fragment: 页面内的交互只重跑所在的 fragment
+# 侧边栏变化会重跑整个脚本, 但只有当前打开的标签页会执行 (见页面末尾)
 
-with tab1:
+def apply_table_edits(editor_key, start, stop, page_size):
+    # 编辑器回调: 只把被修改的单元格、增删的行应用到整张表, 回调之后的重跑即显示新数据, 无需再次 st.rerun
+    # 新增的行插入在当前页末尾; 当前页已满时它们落在下一页开头, 随之翻到该页
+    dataset = st.session_state.dataset
+    old_version = dataset.version
+    changes = dataset.apply_edits(start, st.session_state[editor_key], stop)
+    if changes is not None and changes['added']:
+        position = changes['added_position']
+        page = position // page_size + 1
+        if page != st.session_state.get('editor_page', 1):
+            st.session_state.editor_page = page
+            st.toast(f"新增的 {changes['added']} 行插入在第 {position + 1} 行, 已翻到第 {page} 页")
+    # 增量更新相关性统计量, 热力图无需全量重算
+    if changes is not None and changes['old_rows'] is not None:
+        update_correlation_rows(dataset.frame, old_version, dataset.version, changes['columns'],
+                                changes['old_rows'], changes['new_rows'], changes['removed_rows'],
+                                changes['added_rows'], changes['touched'])
+
+@st.fragment
+def data_table_view():
     col_header, col_toggle = st.columns([3, 1])
     with col_header:
         st.markdown("### 数据表")
@@ -330,7 +442,7 @@ with tab1:
         
         # 使用 st.dataframe 启用选择功能
         selection = st.dataframe(
-            st.session_state.df,
+            st.session_state.dataset.frame,
             width='stretch',
             height=400,
             on_select="rerun",
@@ -338,7 +450,7 @@ with tab1:
         )
         
         # 默认显示全表统计
-        total_rows, total_cols = st.session_state.df.shape
+        total_rows, total_cols = st.session_state.dataset.frame.shape
         
         # 计算选中统计
         # st.dataframe 返回包含 selection 属性的对象
@@ -349,47 +461,27 @@ with tab1:
         
         if has_selection:
             try:
-                # 确定行索引
-                if len(selected_rows) > 0:
-                    target_rows = selected_rows
-                else:
-                    target_rows = range(total_rows) # 如果没选行，默认所有行 (当选了列时)
-                    
-                # 确定列名
-                if len(selected_cols) > 0:
-                    target_cols = selected_cols
-                else:
-                    target_cols = st.session_state.df.columns.tolist() # 如果没选列，默认所有列 (当选了行时)
-                
-                subset = st.session_state.df.iloc[target_rows][target_cols]
-                
-                sel_rows_count = len(target_rows)
-                sel_cols_count = len(target_cols)
-                sel_items = subset.size
-                sel_empty = subset.isna().sum().sum()
+                # 未选行时默认所有行 (当选了列时), 未选列时默认所有列 (当选了行时)
+                target_rows = selected_rows if len(selected_rows) > 0 else None
+                target_cols = selected_cols if len(selected_cols) > 0 else None
                 
-                # 数值统计
-                numeric_subset = subset.select_dtypes(include=[np.number])
-                vals = np.array([])
-                if not numeric_subset.empty:
-                    # flatten to calculate global mean/sum of selection
-                    vals = numeric_subset.values.flatten()
-                    vals = vals[~np.isnan(vals)]
+                # 由按数据版本缓存的列聚合索引计算, 不复制选中的子表
+                stats = selection_stats(st.session_state.dataset.frame, target_rows, target_cols, st.session_state.dataset.version)
                 
                 # 展示
                 m1, m2, m3, m4 = st.columns(4)
-                m1.metric("选中", f"{sel_rows_count}行, {sel_cols_count}列")
-                m2.metric("总项/空值", f"{sel_items} / {sel_empty}")
+                m1.metric("选中", f"{stats['rows']}行, {stats['cols']}列")
+                m2.metric("总项/空值", f"{stats['items']} / {stats['empty']}")
                 
-                if len(vals) > 0:
-                    m3.metric("求和 (Sum)", f"= {vals.sum():.2f}")
-                    m4.metric("均值 (Mean)", f"= {vals.mean():.2f}")
+                if stats['count'] > 0:
+                    m3.metric("求和 (Sum)", f"= {stats['sum']:.2f}")
+                    m4.metric("均值 (Mean)", f"= {stats['mean']:.2f}")
                     
                     s1, s2, s3, s4 = st.columns(4)
-                    s1.metric("中位数 (Median)", f"= {np.median(vals):.2f}")
-                    s2.metric("方差 (Var)", f"= {np.var(vals):.2f}")
-                    s3.metric("最小值 (Min)", f"= {np.min(vals):.2f}")
-                    s4.metric("最大值 (Max)", f"= {np.max(vals):.2f}")
+                    s1.metric("中位数 (Median)", f"= {stats['median']:.2f}")
+                    s2.metric("方差 (Var)", f"= {stats['var']:.2f}")
+                    s3.metric("最小值 (Min)", f"= {stats['min']:.2f}")
+                    s4.metric("最大值 (Max)", f"= {stats['max']:.2f}")
                 else:
                     m3.metric("求和 (Sum)", "N/A")
                     m4.metric("均值 (Mean)", "N/A")
@@ -405,152 +497,221 @@ with tab1:
     else:
         st.markdown("您可以直接在下方表格中编辑数据，图表将自动更新。")
         
-        # 可编辑的 DataFrame
-        edited_df = st.data_editor(
-            st.session_state.df,
+        # 撤销/重做按增量日志恢复, 版本号回到对应的旧版本, 之前的渲染与统计缓存可以直接复用
+        dataset = st.session_state.dataset
+        col_undo, col_redo, col_history = st.columns([1, 1, 2])
+        with col_undo:
+            st.button("撤销", on_click=dataset.undo, disabled=not dataset.can_undo)
+        with col_redo:
+            st.button("重做", on_click=dataset.redo, disabled=not dataset.can_redo)
+        with col_history:
+            history = dataset.history_stats()
+            st.caption(f"可撤销 {history['undo']} 步, 可重做 {history['redo']} 步 (历史占用 {history['log_bytes'] / 2**20:.1f} MB)")
+        
+        # 分页编辑: 每次只把一页数据交给 st.data_editor, 编辑结果以增量形式应用到整张表
+        df = dataset.frame
+        col_page_size, col_page = st.columns(2)
+        with col_page_size:
+            page_size = st.selectbox("每页行数", PAGE_SIZES, index=1, key="editor_page_size")
+        n_pages = max(1, -(-len(df) // page_size))
+        if st.session_state.get('editor_page', 1) > n_pages:
+            st.session_state.editor_page = n_pages
+        with col_page:
+            page = st.number_input("页码", 1, n_pages, key="editor_page", help=f"共 {n_pages} 页")
+        start, stop = page_bounds(len(df), page, page_size)
+        
+        # 键中包含数据版本: 应用编辑后换用新的编辑器, 编辑状态随之清空
+        editor_key = f"data_editor_{st.session_state.dataset.version}_{start}_{page_size}"
+        st.data_editor(
+            df.iloc[start:stop],
             num_rows="dynamic",
             width='stretch',
-            height=500
+            height=500,
+            key=editor_key,
+            on_change=apply_table_edits,
+            args=(editor_key, start, stop, page_size)
         )
-        
-        # 更新 session state
-        if not edited_df.equals(st.session_state.df):
-            st.session_state.df = edited_df
-            st.rerun()
+        st.caption(f"第 {start + 1 if stop else 0}–{stop} 行, 新增的行插入在本页末尾")
             
         # 编辑模式下也显示全表统计
-        total_rows, total_cols = st.session_state.df.shape
+        total_rows, total_cols = st.session_state.dataset.frame.shape
         st.caption(f"{total_rows} 行, {total_cols} 列")
 
-with tab2:
+EXPORT_MIMES = {'png': 'image/png', 'svg': 'image/svg+xml', 'pdf': 'application/pdf'}
+
+def export_buttons(df_plot, data_version, plot_spec):
+    # 导出的图片在点击下载时才由 Matplotlib 渲染 (完整数据, PNG 按设置的 DPI), 结果按数据版本、参数与格式缓存
+    # 表格编辑会原地修改数据, 先取快照 (依赖 pandas 3 的写时复制, 不立即复制数据)
+    snapshot = df_plot.copy(deep=False)
+    for column, format in zip(st.columns(len(EXPORT_MIMES)), EXPORT_MIMES):
+        with column:
+            st.download_button(
+                label=f"导出 ({format.upper()}, {plot_spec.dpi} DPI)" if format == 'png' else f"导出 ({format.upper()})",
+                data=lambda format=format: cached_render(snapshot, data_version, plot_spec, format=format)[0],
+                file_name=f"plot.{format}",
+                mime=EXPORT_MIMES[format],
+                on_click="ignore"
+            )
+
+def interactive_preview(df_plot, data_version, plot_spec):
+    # 浏览器端图表: 只发送降采样后的数据, 缩放/平移/悬停不再触发服务端渲染
+    payload, decimation = interactive_payload(df_plot, plot_spec.x_col, plot_spec.y_cols, plot_spec.plot_type, data_version)
+    st.vega_lite_chart(payload, vega_lite_spec(plot_spec, df_plot[plot_spec.x_col].dtype.kind), width='stretch')
+    if decimation:
+        st.caption("交互预览已降采样: " + ", ".join(f"{label} {n_in:,} → {n_out:,} 点" for label, n_in, n_out in decimation))
+    if plot_spec.extra_axes or plot_spec.enable_interp or plot_spec.enable_peaks or plot_spec.enable_linreg:
+        st.caption("多坐标轴、平滑、寻峰与回归只在导出的图片中显示")
+    export_buttons(df_plot, data_version, plot_spec)
+
+@st.fragment
+def plot_preview(plot_spec, use_render_pool, progressive_render, render_timeout):
     st.markdown("### 绘图预览")
-    df_plot = st.session_state.df
+    df_plot = st.session_state.dataset.frame
     # st.caption("右键点击图片可以下载")
+    
+    interactive = st.toggle("交互预览", False, key="interactive_preview",
+                            help="在浏览器中缩放、平移降采样后的数据, 调整参数时服务端不再重绘; 高质量图片在导出时才由 Matplotlib 生成")
+    if interactive and len(df_plot) > 0:
+        if plot_spec.plot_type in INTERACTIVE_PLOT_TYPES and plot_spec.x_col is not None and plot_spec.y_cols:
+            try:
+                interactive_preview(df_plot, st.session_state.dataset.version, plot_spec)
+                return
+            except Exception as e:
+                st.error(f"交互预览错误: {e}")
+        else:
+            st.caption("交互预览仅支持折线图、散点图与面积图, 当前使用 Matplotlib 渲染")
 
     if len(df_plot) > 0:
-        # 创建 Matplotlib 图形
+        image_slot = st.empty()
+        render_status = st.empty()
         try:
-            # 应用样式和全局设置
-            plt.style.use(theme_style)
-            plt.rcParams.update({
-                'font.sans-serif': [font_family, 'Microsoft YaHei', 'SimHei', 'Arial', 'sans-serif'],
-                'axes.unicode_minus': False,
-                'font.size': font_size,
-                'figure.dpi': dpi
-            })
-            
-            if custom_rc:
-                import json
-                try:
-                    plt.rcParams.update(json.loads(custom_rc))
-                except Exception as e:
-                    st.warning(f"自定义 rcParams 解析失败: {e}")
-
-            fig, ax = plt.subplots(figsize=(fig_width, fig_height), dpi=dpi)
-            
-            # 准备参数，处理可能未定义的变量
-            current_bins = bins if 'bins' in locals() else 20
-            current_interp_kind = interp_kind if 'interp_kind' in locals() else 'linear'
-            current_interp_factor = interp_factor if 'interp_factor' in locals() else 5
-            current_peak_prominence = peak_prominence if 'peak_prominence' in locals() else 0.1
-            current_peak_width = peak_width if 'peak_width' in locals() else 0.0
-            
-            draw_plot_content(ax, plot_type, df_plot, x_col, y_cols, 
-                              marker_style_val, line_style_val, line_width, marker_size, alpha, font_size,
-                              bins=current_bins, 
-                              enable_interp=enable_interp, interp_kind=current_interp_kind, interp_factor=current_interp_factor,
-                              enable_peaks=enable_peaks, peak_prominence=current_peak_prominence, peak_width=current_peak_width,
-                              enable_linreg=enable_linreg, show_linreg_eq=show_linreg_eq, show_linreg_r2=show_linreg_r2, show_linreg_p_value=show_linreg_p_value, show_linreg_str_err=show_linreg_str_err,
-                              extra_axes=extra_axes)
+            # 相同数据版本与参数的渲染结果直接取自缓存
+            # 预览按屏幕分辨率渲染, 调高导出 DPI 不会拖慢预览
+            data_version = st.session_state.dataset.version
+            preview_dpi = min(plot_spec.dpi, PREVIEW_DPI)
+            cached = peek_render(data_version, plot_spec, dpi=preview_dpi)
+            # 渐进式渲染: 缓存未命中的大数据先显示草图, 完整图片交给后台进程
+            draft = cached is None and progressive_render and len(df_plot) > PROGRESSIVE_ROWS
+            if draft:
+                draft_bytes, draft_info = cached_draft(df_plot, data_version, plot_spec)
+                image_slot.image(draft_bytes, width='stretch')
+                render_status.caption(f"草图 (抽样 {draft_info['draft_rows']:,} / {len(df_plot):,} 行), 正在渲染完整图片...")
+            if cached is not None:
+                png_bytes, render_info = cached
+            elif use_render_pool or draft:
+                # 等待期间更新状态文字; 若参数已变化, Streamlit 会在此处中止本次运行, 旧的渲染任务随之取消
+                png_bytes, render_info = cached_render(
+                    df_plot, data_version, plot_spec,
+                    pool=get_render_pool(), slot=st.session_state.session_token, timeout=render_timeout,
+                    on_wait=lambda elapsed: render_status.caption(
+                        f"{'草图已显示, ' if draft else ''}正在后台渲染完整图片... {elapsed:.1f}s"),
+                    dpi=preview_dpi
+                )
+            else:
+                png_bytes, render_info = cached_render(df_plot, data_version, plot_spec, dpi=preview_dpi)
+            render_status.empty()
+            for message in render_info['warnings']:
+                st.warning(message)
 
-            # 坐标轴设置
-            if log_x: ax.set_xscale('log')
-            if log_y: ax.set_yscale('log')
-            if invert_x: ax.invert_xaxis()
-            if invert_y: ax.invert_yaxis()
+            image_slot.image(png_bytes, width='stretch')
+            for message in render_info['notes']:
+                st.caption(message)
+            if render_info['decimation']:
+                st.caption("已降采样: " + ", ".join(f"{label} {n_in:,} → {n_out:,} 点" for label, n_in, n_out in render_info['decimation']))
             
-            # 坐标轴范围手动设置
-            if x_min:
-                try: ax.set_xlim(left=float(x_min))
-                except: pass
-            if x_max:
-                try: ax.set_xlim(right=float(x_max))
-                except: pass
-            if y_min:
-                try: ax.set_ylim(bottom=float(y_min))
-                except: pass
-            if y_max:
-                try: ax.set_ylim(top=float(y_max))
-                except: pass
-
-            # 通用设置
-            ax.set_title(plot_title, fontsize=font_size+2, pad=15)
-            if plot_type not in ["Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"]:
-                if x_label: ax.set_xlabel(x_label, fontsize=font_size)
-                if y_label: ax.set_ylabel(y_label, fontsize=font_size)
+            # 高分辨率 PNG 与矢量格式在点击下载时才生成
+            export_buttons(df_plot, data_version, plot_spec)
             
-            if show_grid and plot_type not in ["Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"]:
-                ax.grid(True, linestyle='--', alpha=0.7)
+            # 峰值表 (与图中红色标记相同, 寻峰结果有缓存)
+            if plot_spec.enable_peaks and plot_spec.plot_type == "Line Plot (折线图)":
+                peak_cols = list(dict.fromkeys(list(plot_spec.y_cols) + [c for axis in plot_spec.extra_axes for c in axis.get('cols', [])]))
+                peaks_df = peak_table(df_plot, plot_spec.x_col, peak_cols, plot_spec.peak_prominence, plot_spec.peak_width,
+                                      data_version)
+                st.download_button(
+                    label=f"下载峰值表 (CSV, {len(peaks_df)} 个峰)",
+                    data=peaks_df.to_csv(index=False).encode('utf-8-sig'),
+                    file_name="peaks.csv",
+                    mime="text/csv",
+                    on_click="ignore"
+                )
             
-            if plot_type not in ["Histogram (直方图)", "Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"] and len(y_cols) > 0 and show_legend:
-                if hasattr(ax, 'custom_handles') and ax.custom_handles:
-                    ax.legend(handles=ax.custom_handles, labels=ax.custom_labels, loc=legend_loc)
-                else:
-                    ax.legend(loc=legend_loc)
-
-            st.pyplot(fig)
+            # 回归结果表 (与图例中的回归参数相同, 结果有缓存)
+            if plot_spec.enable_linreg and plot_spec.plot_type in ["Line Plot (折线图)", "Scatter Plot (散点图)"]:
+                linreg_cols = list(plot_spec.y_cols)
+                if plot_spec.plot_type == "Line Plot (折线图)":
+                    linreg_cols += [c for axis in plot_spec.extra_axes for c in axis.get('cols', [])]
+                with st.expander("回归结果"):
+                    st.dataframe(regression_table(df_plot, plot_spec.x_col, list(dict.fromkeys(linreg_cols)),
+                                                  data_version), width='stretch')
             
-            # 提供高分辨率下载
-            import io
-            img_buffer = io.BytesIO()
-            fig.savefig(img_buffer, format='png', dpi=dpi, bbox_inches='tight')
-            img_buffer.seek(0)
-                           
-            st.download_button(
-                label="下载 (PNG)",
-                data=img_buffer,
-                file_name="plot.png",
-                mime="image/png"
-            )
+            with st.expander("渲染诊断"):
+                cache_stats = render_cache_stats()
+                fig_stats = figure_stats()
+                d1, d2, d3, d4 = st.columns(4)
+                d1.metric("缓存命中/未命中", f"{cache_stats['hits']} / {cache_stats['misses']}")
+                d2.metric("缓存占用", f"{cache_stats['entries']} 项, {cache_stats['bytes'] / 2**20:.1f} MB")
+                d3.metric("存活 Figure", f"{fig_stats['live_figures']} (pyplot: {fig_stats['pyplot_figures']})")
+                d4.metric("常驻内存", f"{fig_stats['rss_bytes'] / 2**20:.0f} MB" if fig_stats['rss_bytes'] else "N/A")
+                st.caption(f"累计创建 {fig_stats['created']} 个 Figure, 已释放 {fig_stats['released']} 个")
+                if use_render_pool:
+                    pool_stats = get_render_pool().stats()
+                    st.caption(f"渲染进程池: {pool_stats['workers']} 个进程, 运行中 {pool_stats['busy']}, 排队 {pool_stats['pending']}, "
+                               f"完成 {pool_stats['completed']}, 取消 {pool_stats['cancelled']}, 超时 {pool_stats['timed_out']}, 失败 {pool_stats['failed']}")
             
         except Exception as e:
+            render_status.empty()
             st.error(f"绘图错误: {e}")
             st.info("请检查您的数据列是否包含非数值类型, 或者X/Y轴选择是否正确。")
     else:
         st.warning("暂无数据")
 
-with tab3:
+@st.fragment
+def code_view(plot_spec):
     st.markdown("### 展示代码")
     st.caption("以下代码可直接复制并在本地 Python 环境中运行, 以供学习参考。")
     
-    df_plot = st.session_state.df
+    df_plot = st.session_state.dataset.frame
     
     if len(df_plot) > 0:
         try:
-            # 准备参数，处理可能未定义的变量
-            current_bins = bins if 'bins' in locals() else 20
-            current_interp_kind = interp_kind if 'interp_kind' in locals() else 'linear'
-            current_interp_factor = interp_factor if 'interp_factor' in locals() else 5
-            current_peak_prominence = peak_prominence if 'peak_prominence' in locals() else 0.1
-            current_peak_width = peak_width if 'peak_width' in locals() else 0.0
-            
-            code = generate_plot_code(plot_type, df_plot, x_col, y_cols, 
-                                    marker_style_val, line_style_val, line_width, marker_size, alpha, font_size,
-                                    bins=current_bins, 
-                                    enable_interp=enable_interp, interp_kind=current_interp_kind, interp_factor=current_interp_factor,
-                                    enable_peaks=enable_peaks, peak_prominence=current_peak_prominence, peak_width=current_peak_width,
-                                    enable_linreg=enable_linreg, show_linreg_eq=show_linreg_eq, show_linreg_r2=show_linreg_r2, show_linreg_p_value=show_linreg_p_value, show_linreg_str_err=show_linreg_str_err,
-                                    plot_title=plot_title, x_label=x_label, y_label=y_label,
-                                    show_grid=show_grid, show_legend=show_legend, legend_loc=legend_loc,
-                                    log_x=log_x, log_y=log_y, invert_x=invert_x, invert_y=invert_y,
-                                    x_min=x_min, x_max=x_max, y_min=y_min, y_max=y_max,
-                                    theme_style=theme_style, font_family=font_family,
-                                    extra_axes=extra_axes
-                                )
+            # 数据较多时默认从数据文件读取, 代码中只保留读取语句
+            data_formats = [f for f in DATA_FORMATS if f != 'parquet' or parquet_available()]
+            data_format = st.radio(
+                "数据来源", data_formats, index=0 if len(df_plot) <= INLINE_MAX_ROWS else 1, horizontal=True,
+                format_func=lambda f: "内联到代码" if f == 'inline' else f"数据文件 ({DATA_FILE_NAMES[f]})",
+                help=f"内联时超过 {INLINE_MAX_ROWS} 行只保留前 {INLINE_MAX_ROWS} 行作为预览"
+            )
+            code = generate_plot_code(df_plot=df_plot, data_format=data_format, **plot_spec.code_kwargs())
             
+            if data_format != 'inline':
+                # 数据文件在点击下载时才生成, 结果按数据版本缓存
+                data_columns = plot_data_columns(df_plot, plot_spec.x_col, plot_spec.y_cols, plot_spec.extra_axes,
+                                                 plot_spec.plot_type)
+                data_version = st.session_state.dataset.version
+                # 表格编辑会原地修改数据, 先取所用列的快照 (依赖 pandas 3 的写时复制, 不立即复制数据)
+                data_frame = df_plot[data_columns]
+                st.download_button(
+                    label=f"下载数据文件 ({DATA_FILE_NAMES[data_format]}, {len(df_plot)} 行 × {len(data_columns)} 列)",
+                    data=lambda: export_plot_data(data_frame, data_columns, data_format, data_version),
+                    file_name=DATA_FILE_NAMES[data_format],
+                    mime=DATA_FILE_MIMES[data_format],
+                    on_click="ignore"
+                )
             st.code(code, language='python')
         except Exception as e:
             st.error(f"代码生成错误: {e}")
     else:
         st.warning("暂无数据")
 
+# 标签页的状态由服务端跟踪, 切换标签页时重跑脚本, 只执行当前打开的标签页
+tab1, tab2, tab3 = st.tabs(["数据表", "绘图预览", "展示代码"], key="main_tab", on_change="rerun")
+
+if tab1.open:
+    with tab1:
+        data_table_view()
+if tab2.open:
+    with tab2:
+        plot_preview(plot_spec, use_render_pool, progressive_render, render_timeout)
+if tab3.open:
+    with tab3:
+        code_view(plot_spec)
@@ -0,0 +1,179 @@
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from data_loader import compact_frame, parse_file
+from plot_spec import PlotSpec
+
+# 批量渲染: 用同一份 PlotSpec 把多个 CSV/Excel 文件渲染为图片
+#   python batch_render.py spec.json "runs/*.csv" -o plots --format png --format pdf -j 4
+# 输出文件按输入文件相对于通配符根目录的路径命名 (runs/a/data.csv -> plots/a/data.png), 多个输入对应同一输出时报错
+# 输出文件比输入文件和 spec 都新时跳过 (--force 强制重新渲染)
+# 失败的文件汇总到错误报告中, 有失败时退出码为 1
+
+FORMATS = ('png', 'svg', 'pdf')
+DATA_EXTENSIONS = ('.csv', '.xlsx', '.xls')
+
+
+def glob_root(pattern):
+    # 通配符之前的目录部分, 如 "runs/**/*.csv" -> "runs"; 不含通配符时为文件所在目录
+    if not glob.has_magic(pattern):
+        return os.path.dirname(pattern)
+    parts = []
+    for part in pattern.replace('\\', '/').split('/'):
+        if glob.has_magic(part):
+            break
+        parts.append(part)
+    return '/'.join(parts)
+
+
+def expand_inputs(patterns):
+    # 展开通配符, 去重并保持顺序, 只保留支持的数据文件
+    # 返回 [(绝对路径, 输出名)], 输出名为相对于通配符根目录、去掉扩展名的路径
+    inputs = {}
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) or ([pattern] if os.path.isfile(pattern) else [])
+        root = os.path.abspath(glob_root(pattern))
+        for match in matches:
+            if match.lower().endswith(DATA_EXTENSIONS):
+                path = os.path.abspath(match)
+                inputs.setdefault(path, os.path.splitext(os.path.relpath(path, root))[0])
+    return list(inputs.items())
+
+
+def output_path(name, out_dir, format):
+    return os.path.join(out_dir, f"{name}.{format}")
+
+
+def is_up_to_date(input_path, outputs, spec_mtime):
+    # 所有输出都存在且比输入文件与 spec 都新
+    source_mtime = max(os.path.getmtime(input_path), spec_mtime)
+    return all(os.path.exists(out) and os.path.getmtime(out) >= source_mtime for out in outputs)
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def render_file(input_path, spec_dict, outputs, encoding='utf-8', sheet_name=0, compact=False):
+    # 在工作进程中执行: 读取一个文件, 按各输出格式渲染, 返回 (耗时, 警告列表)
+    # compact=True 时先压缩列类型 (与网页导入相同), 默认按原始类型渲染
+    from renderer import render_plot
+
+    started = time.monotonic()
+    with open(input_path, 'rb') as f:
+        df = parse_file(f, input_path, encoding, sheet_name)
+    if compact:
+        df = compact_frame(df)
+    spec = PlotSpec.from_dict(spec_dict)
+    missing = [col for col in [spec.x_col, *spec.y_cols] if col is not None and col not in df.columns]
+    if missing:
+        raise ValueError(f"缺少列: {', '.join(map(str, missing))}")
+
+    warnings = []
+    for format, path in outputs.items():
+        image, info = render_plot(df, spec, format=format)
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        _write_atomic(path, image)
+        warnings.extend(info['warnings'])
+    return time.monotonic() - started, list(dict.fromkeys(warnings))
+
+
+def run_batch(spec, inputs, out_dir, formats=('png',), workers=None, force=False,
+              encoding='utf-8', sheet_name=0, spec_mtime=0.0, compact=False, log=print):
+    # inputs 为 expand_inputs 返回的 [(路径, 输出名)]
+    # 返回报告 {'rendered': [...], 'skipped': [...], 'failed': [{'input', 'error'}]}
+    os.makedirs(out_dir, exist_ok=True)
+    spec_dict = spec.to_dict()
+    report = {'rendered': [], 'skipped': [], 'failed': []}
+
+    # 输出名相同的输入 (如 foo.csv 与 foo.xlsx) 会互相覆盖, 全部记为失败
+    claimed = {}
+    for path, name in inputs:
+        claimed.setdefault(os.path.normcase(name), []).append(path)
+    jobs = {}
+    for path, name in inputs:
+        others = [other for other in claimed[os.path.normcase(name)] if other != path]
+        if others:
+            report['failed'].append({'input': path, 'error': f"输出文件名冲突: 与 {', '.join(others)} 同为 {name}"})
+            log(f"失败 {path}: 输出文件名与 {', '.join(others)} 冲突")
+            continue
+        outputs = {format: output_path(name, out_dir, format) for format in formats}
+        if not force and is_up_to_date(path, outputs.values(), spec_mtime):
+            report['skipped'].append(path)
+        else:
+            jobs[path] = outputs
+    log(f"共 {len(inputs)} 个文件, 需要渲染 {len(jobs)} 个, 跳过 {len(report['skipped'])} 个 (已是最新)"
+        + (f", 输出冲突 {len(report['failed'])} 个" if report['failed'] else ""))
+    if not jobs:
+        return report
+
+    total = len(jobs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(render_file, path, spec_dict, outputs, encoding, sheet_name, compact): path
+                   for path, outputs in jobs.items()}
+        for done, future in enumerate(as_completed(futures), 1):
+            path = futures[future]
+            try:
+                elapsed, warnings = future.result()
+            except Exception as e:
+                report['failed'].append({'input': path, 'error': f"{type(e).__name__}: {e}"})
+                log(f"[{done}/{total}] 失败 {path}: {e}")
+                continue
+            report['rendered'].append(path)
+            log(f"[{done}/{total}] 完成 {path} ({elapsed:.2f}s)")
+            for message in warnings:
+                log(f"    警告: {message}")
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="用同一份绘图参数批量渲染多个数据文件")
+    parser.add_argument('spec', help="PlotSpec JSON 文件")
+    parser.add_argument('inputs', nargs='+', help="CSV/Excel 文件或通配符, 如 \"runs/**/*.csv\"")
+    parser.add_argument('-o', '--out-dir', default='plots', help="输出目录 (默认 plots)")
+    parser.add_argument('--format', action='append', choices=FORMATS, help="输出格式, 可重复指定 (默认 png)")
+    parser.add_argument('-j', '--workers', type=int, default=None, help="工作进程数 (默认 CPU 核数)")
+    parser.add_argument('--force', action='store_true', help="忽略已是最新的输出, 全部重新渲染")
+    parser.add_argument('--encoding', default='utf-8', help="CSV 编码")
+    parser.add_argument('--sheet', default=0, help="Excel 工作表名称或序号")
+    parser.add_argument('--compact', action='store_true', help="渲染前压缩列类型 (float64 可能降为 float32), 减少内存占用")
+    parser.add_argument('--report', help="将结果报告写入该 JSON 文件")
+    args = parser.parse_args(argv)
+
+    try:
+        with open(args.spec, encoding='utf-8') as f:
+            spec = PlotSpec.from_json(f.read())
+    except (OSError, ValueError, TypeError) as e:
+        print(f"无法读取 spec: {e}", file=sys.stderr)
+        return 2
+    inputs = expand_inputs(args.inputs)
+    if not inputs:
+        print("没有匹配的输入文件", file=sys.stderr)
+        return 2
+    sheet = int(args.sheet) if str(args.sheet).isdigit() else args.sheet
+
+    started = time.monotonic()
+    report = run_batch(spec, inputs, args.out_dir, tuple(args.format or ['png']), args.workers, args.force,
+                       args.encoding, sheet, os.path.getmtime(args.spec), args.compact,
+                       log=lambda message: print(message, file=sys.stderr, flush=True))
+    print(f"渲染 {len(report['rendered'])} 个, 跳过 {len(report['skipped'])} 个, 失败 {len(report['failed'])} 个, "
+          f"用时 {time.monotonic() - started:.1f}s", file=sys.stderr)
+    for failure in report['failed']:
+        print(f"  {failure['input']}: {failure['error']}", file=sys.stderr)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 1 if report['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+
+class LRUCache:
+    # 线程安全的有界 LRU 缓存, Streamlit 的多个会话运行在同一进程的不同线程中, 可共享同一实例
+    # max_entries 限制条目数, max_bytes 配合 sizeof 限制总字节数, 两者均可为 None 表示不限
+    def __init__(self, max_entries=16, max_bytes=None, sizeof=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof or (lambda value: 0)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.current_bytes = 0
+        self._data = OrderedDict()
+        self._sizes = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            # 单个条目超出预算时不缓存
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._data[key] = value
+            self._sizes[key] = size
+            self.current_bytes += size
+            while self._over_budget():
+                self._remove(next(iter(self._data)))
+                self.evictions += 1
+
+    def _over_budget(self):
+        if self.max_entries is not None and len(self._data) > self.max_entries:
+            return True
+        return self.max_bytes is not None and self.current_bytes > self.max_bytes
+
+    def _remove(self, key):
+        del self._data[key]
+        self.current_bytes -= self._sizes.pop(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._data),
+                'bytes': self.current_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions
+            }
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._sizes.clear()
+            self.current_bytes = 0
+
+
+def array_digest(*arrays):
+    # 数组内容的哈希, 用于没有数据版本号时按内容作为缓存键
+    h = hashlib.blake2b(digest_size=16)
+    for arr in arrays:
+        arr = np.ascontiguousarray(arr)
+        if arr.dtype == object:
+            h.update(repr(arr.tolist()).encode('utf-8'))
+        else:
+            h.update(arr.dtype.str.encode('ascii'))
+            h.update(arr.view(np.uint8).reshape(-1) if arr.size else b'')
+        h.update(b'|')
+    return h.hexdigest()
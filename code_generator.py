@@ -1,3 +1,111 @@
+import importlib.util
+import inspect
+import io
+
+import numpy as np
+
+from cache import LRUCache
+from correlation import (ANNOT_HEIGHT_EM, ANNOT_WIDTH_EM, ANNOTATION_BUDGET, TICK_SPACING_EM, annotation_mask,
+                         heatmap_layout, numeric_columns, order_columns)
+from decimation import decimate, is_monotonic, lttb_decimate, minmax_decimate
+from plot_type import DENSITY_CMAPS, density_counts, density_image, draw_density
+
+# 生成代码中的数据来源: 内联到代码中, 或从随代码下载的数据文件读取
+DATA_FORMATS = ['inline', 'csv', 'npz', 'parquet']
+DATA_FILE_NAMES = {'csv': 'plot_data.csv', 'npz': 'plot_data.npz', 'parquet': 'plot_data.parquet'}
+DATA_FILE_MIMES = {'csv': 'text/csv', 'npz': 'application/octet-stream', 'parquet': 'application/vnd.apache.parquet'}
+# 内联数据的行数上限, 超过时只内联前若干行作为预览, 代码生成的开销与行数无关
+INLINE_MAX_ROWS = 1000
+
+# 数据文件缓存: (数据版本, 列名, 格式) -> 文件字节
+_export_cache = LRUCache(max_entries=None, max_bytes=256 * 2**20, sizeof=len)
+
+
+def parquet_available():
+    # Parquet 需要可选依赖 pyarrow
+    return importlib.util.find_spec('pyarrow') is not None
+
+
+def plot_data_columns(df_plot, x_col, y_cols, extra_axes=None, plot_type=None):
+    # 绘图用到的列 (保持顺序); 相关性热力图使用全部数值列, 未选择任何列时为全部列
+    if plot_type == "Correlation Heatmap (相关性热力图)":
+        return numeric_columns(df_plot)
+    cols = list(dict.fromkeys([c for c in [x_col, *y_cols] if c] + [c for axis in extra_axes or [] for c in axis.get('cols', [])]))
+    return cols or list(df_plot.columns)
+
+
+def _npz_array(series):
+    # npz 中不使用 pickle: 非数值列转换为字符串数组
+    if series.dtype.kind in 'biufcmM':
+        return series.to_numpy()
+    return series.astype(str).to_numpy(dtype=str)
+
+
+def export_plot_data(df_plot, columns, data_format, data_version=None):
+    # 将绘图用到的列写成数据文件, 返回文件字节; 有数据版本时缓存
+    key = (data_version, tuple(columns), data_format) if data_version is not None else None
+    if key is not None:
+        data = _export_cache.get(key)
+        if data is not None:
+            return data
+    df_subset = df_plot[list(columns)]
+    buffer = io.BytesIO()
+    if data_format == 'csv':
+        df_subset.to_csv(buffer, index=False, encoding='utf-8')
+    elif data_format == 'npz':
+        # 列名单独保存, 数组以 c0, c1, ... 命名, 避免列名中的特殊字符
+        arrays = {f"c{i}": _npz_array(df_subset.iloc[:, i]) for i in range(len(columns))}
+        np.savez(buffer, columns=np.array([str(c) for c in columns], dtype=str), **arrays)
+    elif data_format == 'parquet':
+        df_subset.to_parquet(buffer, index=False)
+    else:
+        raise ValueError(f"不支持的数据文件格式: {data_format}")
+    data = buffer.getvalue()
+    if key is not None:
+        _export_cache.put(key, data)
+    return data
+
+
+def _data_loading_code(df_plot, used_cols, data_format, inline_max_rows):
+    code = ["# 准备数据"]
+    if data_format == 'inline':
+        df_subset = df_plot[used_cols]
+        if len(df_subset) > inline_max_rows:
+            code.append(f"# 数据共 {len(df_subset)} 行, 此处仅内联前 {inline_max_rows} 行作为预览; 完整数据请选择数据文件方式导出")
+            df_subset = df_subset.head(inline_max_rows)
+        code.append(f"data = {df_subset.to_dict(orient='list')}")
+        code.append("df = pd.DataFrame(data)")
+    elif data_format == 'csv':
+        code.append(f"# 数据文件 {DATA_FILE_NAMES['csv']} 与本脚本放在同一目录")
+        code.append(f"df = pd.read_csv('{DATA_FILE_NAMES['csv']}')")
+    elif data_format == 'npz':
+        code.append(f"# 数据文件 {DATA_FILE_NAMES['npz']} 与本脚本放在同一目录")
+        code.append(f"with np.load('{DATA_FILE_NAMES['npz']}') as npz:")
+        code.append("    df = pd.DataFrame({name: npz[f'c{i}'] for i, name in enumerate(npz['columns'])})")
+    elif data_format == 'parquet':
+        code.append(f"# 数据文件 {DATA_FILE_NAMES['parquet']} 与本脚本放在同一目录 (需要安装 pyarrow)")
+        code.append(f"df = pd.read_parquet('{DATA_FILE_NAMES['parquet']}')")
+    else:
+        raise ValueError(f"不支持的数据来源: {data_format}")
+    code.append("")
+    return code
+
+
+def _decimation_helper_code(decimation_method, decimation_pixels):
+    # 直接输出 WebUI 使用的降采样函数源码, 保证生成的代码与预览完全一致
+    code = ["# 按像素宽度降采样 (与 WebUI 相同的算法)"]
+    for func in (is_monotonic, minmax_decimate, lttb_decimate, decimate):
+        code.extend(inspect.getsource(func).rstrip().split("\n"))
+        code.append("")
+    code.append("def decimate_for_plot(x, y):")
+    code.append("    x, y = np.asarray(x), np.asarray(y)")
+    code.append("    if x.dtype.kind in 'iuf' and y.dtype.kind in 'iuf' and is_monotonic(x):")
+    code.append(f"        return decimate(x, y, {decimation_pixels}, '{decimation_method}')")
+    code.append("    return x, y")
+    code.append("")
+    return code
+
+
 def generate_plot_code(plot_type, df_plot, x_col, y_cols, 
                       marker_style_val, line_style_val, line_width, marker_size, alpha, font_size,
                       bins=20, 
@@ -9,17 +117,30 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
                       log_x=False, log_y=False, invert_x=False, invert_y=False,
                       x_min="", x_max="", y_min="", y_max="",
                       theme_style="default", font_family="SimHei",
-                      extra_axes=None):
+                      extra_axes=None,
+                      enable_decimation=False, decimation_method='minmax', decimation_pixels=1000,
+                      enable_density=True, density_threshold=100_000,
+                      heatmap_order='original', heatmap_top_k=20,
+                      heatmap_annot_threshold=0.0, heatmap_annot_budget=ANNOTATION_BUDGET,
+                      data_format='inline', inline_max_rows=INLINE_MAX_ROWS):
     
     if extra_axes is None: extra_axes = []
     code = []
+    # 与预览相同: 散点数超过阈值时绘制密度图
+    use_density = enable_density and plot_type == "Scatter Plot (散点图)" and len(df_plot) > density_threshold
     
     # Imports
+    if use_density:
+        code.append("import matplotlib")
     code.append("import matplotlib.pyplot as plt")
     code.append("import pandas as pd")
     code.append("import numpy as np")
+    if use_density:
+        code.append("from matplotlib.colors import LogNorm")
     if enable_interp or enable_linreg or enable_peaks:
         code.append("from scipy import interpolate, signal, stats")
+    if plot_type == "Correlation Heatmap (相关性热力图)" and heatmap_order == 'clustered':
+        code.append("from scipy.cluster import hierarchy")
     code.append("")
 
     # Style setup
@@ -33,23 +154,27 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
     code.append("")
 
     # Data
-    used_cols = set()
-    if x_col: used_cols.add(x_col)
-    for c in y_cols: used_cols.add(c)
-    for axis in extra_axes:
-        for c in axis.get('cols', []):
-            used_cols.add(c)
-    
-    if used_cols:
-        df_subset = df_plot[list(used_cols)]
-        data_dict = df_subset.to_dict(orient='list')
-    else:
-        data_dict = df_plot.to_dict(orient='list')
+    used_cols = plot_data_columns(df_plot, x_col, y_cols, extra_axes, plot_type)
+    code.extend(_data_loading_code(df_plot, used_cols, data_format, inline_max_rows))
 
-    code.append("# 准备数据")
-    code.append(f"data = {data_dict}")
-    code.append("df = pd.DataFrame(data)")
-    code.append("")
+    # 与预览相同的阈值: 点数明显多于像素宽度时才降采样
+    decimation_threshold = (2 if decimation_method == 'lttb' else 4) * decimation_pixels
+    use_decimation = enable_decimation and plot_type == "Line Plot (折线图)" and len(df_plot) > decimation_threshold
+    if use_decimation:
+        code.extend(_decimation_helper_code(decimation_method, decimation_pixels))
+    if use_density:
+        code.append("# 密度图 (与 WebUI 相同的算法)")
+        code.append(f"DENSITY_CMAPS = {DENSITY_CMAPS}")
+        code.append("")
+        for func in (density_counts, draw_density, density_image):
+            code.extend(inspect.getsource(func).rstrip().split("\n"))
+            code.append("")
+    density_bins = int(np.clip(decimation_pixels // 4, 64, 512))
+    scatter_code = (
+        f"density_image({{ax}}, df['{x_col}'], df[y_col], y_col, DENSITY_CMAPS[series_index % len(DENSITY_CMAPS)], {density_bins}, {alpha})"
+        if use_density else
+        f"{{ax}}.scatter(df['{x_col}'], df[y_col], marker='{marker_style_val}', s={marker_size}, label=y_col, alpha={alpha})"
+    )
     
     # Plot setup
     code.append("# 创建图表")
@@ -61,6 +186,8 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
         c = []
         c.append(f"    x_data = df['{x_col_name}']")
         c.append(f"    y_data = df[{y_col_var}]")
+        # 降采样只影响绘制的点, 寻峰与回归仍使用完整数据
+        plot_xy = "*decimate_for_plot(x_data, y_data)" if use_decimation else "x_data, y_data"
         
         if enable_interp:
             c.append(f"    # 插值处理")
@@ -79,12 +206,14 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
                 c.append(f"        x_new = np.linspace(x_sorted.min(), x_sorted.max(), len(x_sorted) * {interp_factor})")
                 c.append(f"        y_new = f(x_new)")
             
+            if use_decimation:
+                c.append(f"        x_new, y_new = decimate_for_plot(x_new, y_new)")
             c.append(f"        {ax_name}.plot(x_new, y_new, marker='', linestyle='{line_style_val}', linewidth={line_width}, label=f'{{{y_col_var}}} (smooth)', alpha={alpha})")
-            c.append(f"        {ax_name}.scatter(x_data, y_data, marker='{marker_style_val}', s={marker_size}/5, alpha=0.5)")
+            c.append(f"        {ax_name}.scatter({plot_xy}, marker='{marker_style_val}', s={marker_size}/5, alpha=0.5)")
             c.append(f"    else:")
-            c.append(f"        {ax_name}.plot(x_data, y_data, marker='{marker_style_val}', linestyle='{line_style_val}', linewidth={line_width}, markersize={marker_size}/5, label={y_col_var}, alpha={alpha})")
+            c.append(f"        {ax_name}.plot({plot_xy}, marker='{marker_style_val}', linestyle='{line_style_val}', linewidth={line_width}, markersize={marker_size}/5, label={y_col_var}, alpha={alpha})")
         else:
-            c.append(f"    {ax_name}.plot(x_data, y_data, marker='{marker_style_val}', linestyle='{line_style_val}', linewidth={line_width}, markersize={marker_size}/5, label={y_col_var}, alpha={alpha})")
+            c.append(f"    {ax_name}.plot({plot_xy}, marker='{marker_style_val}', linestyle='{line_style_val}', linewidth={line_width}, markersize={marker_size}/5, label={y_col_var}, alpha={alpha})")
 
         if enable_peaks:
             c.append(f"    peaks, _ = signal.find_peaks(y_data, prominence={peak_prominence}, width={peak_width})")
@@ -152,8 +281,15 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
     elif plot_type == "Scatter Plot (散点图)":
         code.append(f"# 绘制散点图")
         code.append(f"y_cols = {y_cols}")
+        if use_density:
+            code.append(f"series_index = 0")
+            code.append(f"density_images = []")
         code.append(f"for y_col in y_cols:")
-        code.append(f"    ax.scatter(df['{x_col}'], df[y_col], marker='{marker_style_val}', s={marker_size}, label=y_col, alpha={alpha})")
+        if use_density:
+            code.append(f"    density_images.append((" + scatter_code.format(ax="ax") + ", y_col))")
+            code.append(f"    series_index += 1")
+        else:
+            code.append(f"    " + scatter_code.format(ax="ax"))
         if enable_linreg:
             code.append(f"    # 线性回归")
             code.append(f"    x_data = df['{x_col}']")
@@ -204,7 +340,20 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
                 
                 code.append(f"axis_cols = {cols}")
                 code.append(f"for y_col in axis_cols:")
-                code.append(f"    new_ax.scatter(df['{x_col}'], df[y_col], marker='{marker_style_val}', s={marker_size}, label=y_col, alpha={alpha})")
+                if use_density:
+                    code.append(f"    density_images.append((" + scatter_code.format(ax="new_ax") + ", y_col))")
+                    code.append(f"    series_index += 1")
+                else:
+                    code.append(f"    " + scatter_code.format(ax="new_ax"))
+
+        if use_density:
+            code.append("")
+            code.append("# 为第一个密度图添加色条")
+            code.append("if density_images:")
+            code.append("    im, y_col = density_images[0]")
+            pad = 0.1 if extra_axes else 0.03
+            code.append(f"    colorbar = fig.colorbar(im, ax=[ax] + {'extra_ax_objects' if extra_axes else '[]'}, pad={pad})")
+            code.append("    colorbar.set_label(f'{y_col} 点数')")
 
     elif plot_type == "Bar Chart (柱状图)":
         code.append(f"# 绘制柱状图")
@@ -219,7 +368,12 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
 
     elif plot_type == "Histogram (直方图)":
         code.append(f"# 绘制直方图")
-        code.append(f"ax.hist(df['{x_col}'], bins={bins}, alpha={alpha}, color='#0078d4', edgecolor='black')")
+        if df_plot[x_col].dtype.kind in 'iuf':
+            code.append(f"values = df['{x_col}'].to_numpy(dtype=float)")
+            code.append(f"counts, edges = np.histogram(values[np.isfinite(values)], bins={bins})")
+            code.append(f"ax.stairs(counts, edges, fill=True, alpha={alpha}, facecolor='#0078d4', edgecolor='black')")
+        else:
+            code.append(f"ax.hist(df['{x_col}'], bins={bins}, alpha={alpha}, color='#0078d4', edgecolor='black')")
 
     elif plot_type == "Box Plot (箱线图)":
         code.append(f"# 绘制箱线图")
@@ -253,18 +407,32 @@ def generate_plot_code(plot_type, df_plot, x_col, y_cols,
         code.append(f"ax.set_xticklabels(y_cols)")
 
     elif plot_type == "Correlation Heatmap (相关性热力图)":
+        code.append("# 列排序与数值标注 (与 WebUI 相同的规则)")
+        code.append(f"ANNOTATION_BUDGET = {ANNOTATION_BUDGET}")
+        code.append(f"TICK_SPACING_EM = {TICK_SPACING_EM}")
+        code.append(f"ANNOT_WIDTH_EM = {ANNOT_WIDTH_EM}")
+        code.append(f"ANNOT_HEIGHT_EM = {ANNOT_HEIGHT_EM}")
+        code.append("")
+        for func in (order_columns, heatmap_layout, annotation_mask):
+            code.extend(inspect.getsource(func).rstrip().split("\n"))
+            code.append("")
         code.append(f"# 绘制相关性热力图")
-        code.append(f"corr = df.select_dtypes(include=[np.number]).corr()")
-        code.append(f"im = ax.imshow(corr, cmap='coolwarm', interpolation='nearest')")
+        code.append(f"corr_df = df.select_dtypes(include=[np.number]).corr()")
+        code.append(f"order = order_columns(corr_df.to_numpy(), '{heatmap_order}', {heatmap_top_k})")
+        code.append(f"corr = corr_df.to_numpy()[np.ix_(order, order)]")
+        code.append(f"labels = corr_df.columns[order]")
+        code.append(f"im = ax.imshow(corr, cmap='coolwarm', vmin=-1, vmax=1, interpolation='nearest')")
         code.append(f"plt.colorbar(im, ax=ax)")
-        code.append(f"tick_marks = np.arange(len(corr.columns))")
+        code.append(f"step, annot_budget = heatmap_layout(ax, len(labels), {font_size}, {heatmap_annot_budget})")
+        code.append(f"tick_marks = np.arange(0, len(labels), step)")
         code.append(f"ax.set_xticks(tick_marks)")
         code.append(f"ax.set_yticks(tick_marks)")
-        code.append(f"ax.set_xticklabels(corr.columns, rotation=45)")
-        code.append(f"ax.set_yticklabels(corr.columns)")
-        code.append(f"for i in range(len(corr.columns)):")
-        code.append(f"    for j in range(len(corr.columns)):")
-        code.append(f"        text = ax.text(j, i, f'{{corr.iloc[i, j]:.2f}}', ha='center', va='center', color='black', fontsize={font_size}-2)")
+        code.append(f"ax.set_xticklabels(labels[tick_marks], rotation=45)")
+        code.append(f"ax.set_yticklabels(labels[tick_marks])")
+        code.append(f"mask = annotation_mask(corr, annot_budget, {heatmap_annot_threshold})")
+        code.append(f"for i, j in zip(*np.nonzero(mask)):")
+        code.append(f"    ax.text(j, i, f'{{corr[i, j]:.2f}}', ha='center', va='center', color='black', fontsize={font_size}-2)")
+        code.append("")
 
     # Common styling
     code.append("")
@@ -0,0 +1,333 @@
+import numpy as np
+from scipy.cluster import hierarchy
+
+from cache import LRUCache, array_digest
+
+# 每次参与矩阵乘法的行数, 限制中间数组的内存占用
+BLOCK_ROWS = 65536
+# 默认最多标注的单元格数量
+ANNOTATION_BUDGET = 400
+# 刻度标签与数值标注占用的空间 (以字号为单位): 相邻刻度标签的最小间距, 数值文字 (如 "-0.25") 的宽与高
+TICK_SPACING_EM = 1.5
+ANNOT_WIDTH_EM = 2.8
+ANNOT_HEIGHT_EM = 1.2
+HEATMAP_ORDERS = ['original', 'clustered', 'top-k']
+
+# 相关性统计量缓存: (数据版本, 列) -> CorrelationStats
+_stats_cache = LRUCache(max_entries=8)
+
+
+def numeric_columns(df):
+    return df.select_dtypes(include=[np.number]).columns.tolist()
+
+
+def _column_values(series):
+    # 数值列的 NumPy 数组; 可空整数/浮点 (Int64、Float64) 转为 float64, pd.NA 记为 NaN, 与其他列一样成对删除缺失值
+    if isinstance(series.dtype, np.dtype):
+        return series.to_numpy()
+    return series.to_numpy(dtype='float64', na_value=np.nan)
+
+
+class CorrelationStats:
+    # 相关系数矩阵的充分统计量 (各列先减去固定的平移量 shift 以减小舍入误差):
+    #   无缺失值时: 行数 n, 列和 s, 列平方和 q, 交叉积 p
+    #   有缺失值时: 按成对有效行统计的 n, s, q (均为矩阵, s[i, j] 为 i、j 同时有效的行上 i 列之和)
+    # 相关系数与 pandas 的 DataFrame.corr() 一致 (成对删除缺失值)
+    def __init__(self, columns, shift, constant, has_nan, n, s, q, p):
+        self.columns = columns
+        self.shift = shift
+        self.constant = constant
+        self.has_nan = has_nan
+        self.n = n
+        self.s = s
+        self.q = q
+        self.p = p
+
+    @classmethod
+    def from_frame(cls, df, columns=None, block_rows=BLOCK_ROWS):
+        columns = numeric_columns(df) if columns is None else list(columns)
+        arrays = [_column_values(df[col]) for col in columns]
+        k = len(columns)
+        shift = np.zeros(k)
+        constant = np.zeros(k, dtype=bool)
+        has_nan = False
+        for j, arr in enumerate(arrays):
+            if arr.dtype.kind == 'f':
+                finite = np.isfinite(arr)
+                has_nan = has_nan or not finite.all()
+                valid = arr[finite] if not finite.all() else arr
+            else:
+                valid = arr
+            if len(valid):
+                shift[j] = valid.mean()
+                constant[j] = valid.min() == valid.max()
+            else:
+                constant[j] = True
+
+        if has_nan:
+            n = np.zeros((k, k))
+            s = np.zeros((k, k))
+            q = np.zeros((k, k))
+        else:
+            n = 0
+            s = np.zeros(k)
+            q = np.zeros(k)
+        p = np.zeros((k, k))
+
+        rows = len(df)
+        for start in range(0, rows, block_rows):
+            end = min(start + block_rows, rows)
+            block = np.empty((end - start, k), dtype=np.float32)
+            for j, arr in enumerate(arrays):
+                block[:, j] = arr[start:end] - shift[j]
+            if has_nan:
+                mask = np.isfinite(block)
+                block[~mask] = 0
+                weights = mask.astype(np.float32)
+                n += weights.T @ weights
+                s += block.T @ weights
+                q += (block * block).T @ weights
+            else:
+                n += end - start
+                s += block.sum(axis=0, dtype=np.float64)
+                q += (block * block).sum(axis=0, dtype=np.float64)
+            p += block.T @ block
+
+        return cls(columns, shift, constant, has_nan, n, s, q, p)
+
+    def matrix(self):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if self.has_nan:
+                n = self.n
+                cov = self.p - self.s * self.s.T / n
+                var = self.q - self.s ** 2 / n
+                corr = cov / np.sqrt(var * var.T)
+                corr[n < 2] = np.nan
+            else:
+                cov = self.p - np.outer(self.s, self.s) / self.n
+                var = self.q - self.s ** 2 / self.n
+                corr = cov / np.sqrt(np.outer(var, var))
+                if self.n < 2:
+                    corr[:] = np.nan
+        corr = np.clip(corr, -1.0, 1.0)
+        corr[self.constant, :] = np.nan
+        corr[:, self.constant] = np.nan
+        diagonal = np.diag_indices_from(corr)
+        corr[diagonal] = np.where(np.isnan(corr[diagonal]), np.nan, 1.0)
+        return corr.astype(np.float32)
+
+    def copy(self):
+        copy = lambda v: v.copy() if isinstance(v, np.ndarray) else v
+        return CorrelationStats(list(self.columns), self.shift.copy(), self.constant.copy(), self.has_nan,
+                                copy(self.n), copy(self.s), copy(self.q), self.p.copy())
+
+    def _centered(self, rows):
+        # 原始值 (行 × 列) -> 平移后的值与有效性掩码, 缺失值置 0
+        z = np.asarray(rows, dtype=float) - self.shift
+        valid = np.isfinite(z)
+        z[~valid] = 0
+        return z, valid.astype(float)
+
+    def _to_pairwise(self):
+        # 首次出现缺失值时, 把向量形式的统计量展开为成对形式
+        k = len(self.columns)
+        self.n = np.full((k, k), float(self.n))
+        self.s = np.tile(self.s[:, None], (1, k))
+        self.q = np.tile(self.q[:, None], (1, k))
+        self.has_nan = True
+
+    def add_rows(self, rows, sign=1):
+        # 加入 (sign=-1 时移除) 若干行, 每行 O(列数²)
+        z, w = self._centered(rows)
+        if not self.has_nan and not w.all():
+            self._to_pairwise()
+        if self.has_nan:
+            self.n += sign * (w.T @ w)
+            self.s += sign * (z.T @ w)
+            self.q += sign * ((z * z).T @ w)
+        else:
+            self.n += sign * len(z)
+            self.s += sign * z.sum(axis=0)
+            self.q += sign * (z * z).sum(axis=0)
+        self.p += sign * (z.T @ z)
+
+    def remove_rows(self, rows):
+        self.add_rows(rows, sign=-1)
+
+    def update_rows(self, old_rows, new_rows):
+        # 逐行替换取值: a'b'ᵀ - abᵀ = (a' - a)b'ᵀ + a(b' - b)ᵀ
+        # 只有被修改的列 C 非零, 因此每行只更新矩阵的 C 行与 C 列, 耗时 O(|C|·列数)
+        old_z, old_w = self._centered(old_rows)
+        new_z, new_w = self._centered(new_rows)
+        if not self.has_nan and not new_w.all():
+            self._to_pairwise()
+        for zo, wo, zn, wn in zip(old_z, old_w, new_z, new_w):
+            changed = np.flatnonzero((zo != zn) | (wo != wn))
+            if not len(changed):
+                continue
+            dz = zn[changed] - zo[changed]
+            if self.has_nan:
+                dw = wn[changed] - wo[changed]
+                qo, qn = zo * zo, zn * zn
+                for m, ao, an, bo, bn in ((self.n, wo, wn, wo, wn), (self.s, zo, zn, wo, wn), (self.q, qo, qn, wo, wn)):
+                    m[changed, :] += np.outer(an[changed] - ao[changed], bn)
+                    m[:, changed] += np.outer(ao, bn[changed] - bo[changed])
+            else:
+                self.s[changed] += dz
+                self.q[changed] += zn[changed] ** 2 - zo[changed] ** 2
+            self.p[changed, :] += np.outer(dz, zn)
+            self.p[:, changed] += np.outer(zo, dz)
+
+    def refresh_constant(self, df, columns):
+        # 修改后重新判断指定列是否为常数列 (每列 O(行数))
+        for col in columns:
+            j = self.columns.index(col)
+            values = _column_values(df[col])
+            if values.dtype.kind == 'f':
+                values = values[np.isfinite(values)]
+            self.constant[j] = len(values) == 0 or values.min() == values.max()
+
+
+def correlation_stats(df, data_version=None):
+    # 无数据版本时按数值列内容计算缓存键
+    columns = numeric_columns(df)
+    if data_version is None:
+        data_version = array_digest(*(_column_values(df[col]) for col in columns))
+    key = (data_version, tuple(columns))
+    stats = _stats_cache.get(key)
+    if stats is None:
+        stats = CorrelationStats.from_frame(df, columns)
+        _stats_cache.put(key, stats)
+    return stats
+
+
+def update_correlation(old_df, new_df, old_version, new_version):
+    # 表格编辑后, 由旧版本的统计量增量得到新版本的统计量, 避免下次绘制热力图时全量重算
+    # 行按索引对齐: 两边都有的行按修改处理, 仅旧表有的行移除, 仅新表有的行加入
+    # 旧版本没有缓存或数值列发生变化时不做处理, 下次绘制时全量计算
+    columns = numeric_columns(new_df)
+    if numeric_columns(old_df) != columns:
+        return None
+    old_stats = _stats_cache.get((old_version, tuple(columns)))
+    if old_stats is None:
+        return None
+    if not (old_df.index.is_unique and new_df.index.is_unique):
+        return None
+
+    # 两边共有行的位置; 索引相同 (最常见的单元格编辑) 时无需对齐
+    if old_df.index.equals(new_df.index):
+        old_pos = new_pos = slice(None)
+        removed = added = np.empty(0, dtype=np.intp)
+    else:
+        matched = old_df.index.get_indexer(new_df.index)
+        new_pos = np.flatnonzero(matched >= 0)
+        old_pos = matched[new_pos]
+        added = np.flatnonzero(matched < 0)
+        removed = np.setdiff1d(np.arange(len(old_df)), old_pos)
+
+    # 逐列比较, 找出被修改的行与列, 避免复制整张表
+    old_arrays = [_column_values(old_df[col]) for col in columns]
+    new_arrays = [_column_values(new_df[col]) for col in columns]
+    changed_rows = []
+    touched = []
+    for old_arr, new_arr in zip(old_arrays, new_arrays):
+        a = old_arr[old_pos].astype(float, copy=False)
+        b = new_arr[new_pos].astype(float, copy=False)
+        rows = np.flatnonzero((a != b) & ~(np.isnan(a) & np.isnan(b)))
+        changed_rows.append(rows)
+        touched.append(len(rows) > 0)
+    changed_rows = np.unique(np.concatenate(changed_rows))
+
+    def take(arrays, positions, rows):
+        if isinstance(positions, slice):
+            return np.column_stack([arr[rows] for arr in arrays]).astype(float)
+        return np.column_stack([arr[positions[rows]] for arr in arrays]).astype(float)
+
+    old_rows = new_rows = removed_rows = added_rows = None
+    if len(changed_rows):
+        old_rows, new_rows = take(old_arrays, old_pos, changed_rows), take(new_arrays, new_pos, changed_rows)
+    if len(removed):
+        removed_rows = np.column_stack([arr[removed] for arr in old_arrays]).astype(float)
+    if len(added):
+        added_rows = np.column_stack([arr[added] for arr in new_arrays]).astype(float)
+    touched = [col for col, t in zip(columns, touched) if t]
+    return _apply_row_changes(old_stats, new_df, new_version, old_rows, new_rows, removed_rows, added_rows, touched)
+
+
+def update_correlation_rows(new_df, old_version, new_version, columns,
+                            old_rows=None, new_rows=None, removed_rows=None, added_rows=None, touched=()):
+    # 已知修改内容 (如表格编辑器的增量) 时直接更新统计量, 无需比较新旧两张表
+    # columns 为编辑前的数值列, 各行数组的列与之对应; touched 为值被修改的列
+    if numeric_columns(new_df) != list(columns):
+        return None
+    old_stats = _stats_cache.get((old_version, tuple(columns)))
+    if old_stats is None:
+        return None
+    return _apply_row_changes(old_stats, new_df, new_version, old_rows, new_rows, removed_rows, added_rows, touched)
+
+
+def _apply_row_changes(old_stats, new_df, new_version, old_rows, new_rows, removed_rows, added_rows, touched):
+    stats = old_stats.copy()
+    if old_rows is not None and len(old_rows):
+        stats.update_rows(old_rows, new_rows)
+    if removed_rows is not None and len(removed_rows):
+        stats.remove_rows(removed_rows)
+    if added_rows is not None and len(added_rows):
+        stats.add_rows(added_rows)
+
+    if (removed_rows is not None and len(removed_rows)) or (added_rows is not None and len(added_rows)):
+        touched = stats.columns
+    stats.refresh_constant(new_df, touched)
+    _stats_cache.put((new_version, tuple(stats.columns)), stats)
+    return stats
+
+
+def correlation_matrix(df, data_version=None):
+    stats = correlation_stats(df, data_version)
+    return stats.columns, stats.matrix()
+
+
+def order_columns(corr, method='original', top_k=20):
+    # 返回列的显示顺序: 原始顺序 / 层次聚类 / 平均相关性最强的前 k 列
+    k = len(corr)
+    if k < 3 or method == 'original':
+        return np.arange(k)
+    strength = np.nan_to_num(np.abs(corr), nan=0.0)
+    if method == 'top-k':
+        np.fill_diagonal(strength, 0.0)
+        return np.sort(np.argsort(-strength.sum(axis=1), kind='stable')[:top_k])
+    distance = 1.0 - strength
+    np.fill_diagonal(distance, 0.0)
+    condensed = distance[np.triu_indices(k, 1)]
+    return hierarchy.leaves_list(hierarchy.linkage(condensed, method='average'))
+
+
+def heatmap_layout(ax, n_cols, font_size, budget=ANNOTATION_BUDGET):
+    # 按坐标轴的像素尺寸 (图片大小、DPI 与 colorbar 占去的空间) 和字号决定刻度间隔与标注预算
+    # imshow 的格子为正方形, 边长取坐标轴宽高中较小者; 格子放不下数值文字 (字号 font_size - 2) 时不标注
+    # 返回 (刻度间隔, 标注预算)
+    bbox = ax.get_window_extent()
+    side = min(bbox.width, bbox.height)
+    px_per_point = ax.figure.dpi / 72
+    max_ticks = max(1, int(side // (font_size * px_per_point * TICK_SPACING_EM)))
+    step = max(1, -(-n_cols // max_ticks))
+    cell = side / max(n_cols, 1)
+    annot_size = max(font_size - 2, 1) * px_per_point
+    if cell < annot_size * ANNOT_WIDTH_EM or cell < annot_size * ANNOT_HEIGHT_EM:
+        budget = 0
+    return step, min(budget, n_cols * n_cols)
+
+
+def annotation_mask(corr, budget=ANNOTATION_BUDGET, threshold=0.0):
+    # 标注 |r| 不低于阈值的单元格; 超出预算时只保留 |r| 最大的单元格 (对角线优先级最低)
+    strength = np.nan_to_num(np.abs(corr), nan=-1.0)
+    mask = strength >= threshold
+    if mask.sum() <= budget:
+        return mask
+    ranking = strength.copy()
+    np.fill_diagonal(ranking, -0.5)
+    ranking[~mask] = -2.0
+    flat = np.argsort(-ranking, axis=None, kind='stable')[:budget]
+    mask = np.zeros(corr.shape, dtype=bool)
+    mask.flat[flat] = True
+    return mask
@@ -0,0 +1,188 @@
+import hashlib
+import io
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from cache import LRUCache
+from dataset_store import has_dataset, make_dataset_id, open_dataset, read_dataset_meta, write_dataset
+
+# 流式导入每块的行数
+DEFAULT_CHUNKSIZE = 200_000
+# 文本列唯一值占比不超过该值时转为 category
+CATEGORY_MAX_RATIO = 0.5
+# float64 -> float32 允许的最大误差, 相对于列的取值范围 (最大值 - 最小值)
+# 误差只与单个值的大小成比例, 大偏移量的列 (时间戳、ID) 相邻值的差远小于该误差, 因此以列自身的尺度衡量
+FLOAT32_RTOL = 1e-6
+
+# 已打开的数据集缓存: 数据集ID -> (DataFrame, 导入报告)
+# 数据集ID 由 (文件内容哈希, 编码, 工作表, 导入模式) 导出, 同一文件只解析并转换一次
+# 缓存的 DataFrame 由只读内存映射支撑, 视为只读, 编辑总是生成新的对象
+_parsed_frames = LRUCache(max_entries=8)
+# 工作表名称缓存: file_id -> [sheet names]
+_sheet_names = LRUCache(max_entries=32)
+
+
+def file_digest(uploaded_file):
+    # getbuffer() 直接返回底层内存视图, 避免为计算哈希再复制一份文件
+    return hashlib.sha256(uploaded_file.getbuffer()).hexdigest()
+
+
+def is_csv(file_name):
+    return file_name.lower().endswith('.csv')
+
+
+def list_excel_sheets(uploaded_file):
+    sheets = _sheet_names.get(uploaded_file.file_id)
+    if sheets is None:
+        uploaded_file.seek(0)
+        with pd.ExcelFile(uploaded_file) as xls:
+            sheets = list(xls.sheet_names)
+        _sheet_names.put(uploaded_file.file_id, sheets)
+    return sheets
+
+
+def _is_text(series):
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        return False
+    return series.dtype == object or pd.api.types.is_string_dtype(series.dtype)
+
+
+def compact_series(series, category_max_ratio=CATEGORY_MAX_RATIO, float_rtol=FLOAT32_RTOL):
+    kind = series.dtype.kind
+    if kind == 'i':
+        return pd.to_numeric(series, downcast='integer')
+    if kind == 'u':
+        return pd.to_numeric(series, downcast='unsigned')
+    if kind == 'f' and series.dtype != np.float32:
+        values = series.to_numpy()
+        finite = values[np.isfinite(values)]
+        if finite.size and np.abs(finite).max() > np.finfo(np.float32).max:
+            return series
+        # 仅在往返转换的最大误差不超过取值范围的 float_rtol 倍时降为 float32; 常数列要求精确往返
+        if finite.size:
+            error = np.abs(finite.astype(np.float32).astype(np.float64) - finite).max()
+            if error <= float_rtol * (finite.max() - finite.min()):
+                return series.astype(np.float32)
+        return series
+    if _is_text(series):
+        if len(series) and series.nunique(dropna=True) <= category_max_ratio * len(series):
+            return series.astype('category')
+        return series
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # 合并后的分类列若唯一值过多, 还原为原始的文本类型
+        if len(series) and len(series.cat.categories) > category_max_ratio * len(series):
+            return series.astype(series.cat.categories.dtype)
+    return series
+
+
+def compact_frame(df, category_max_ratio=CATEGORY_MAX_RATIO, float_rtol=FLOAT32_RTOL):
+    # copy=False: 各列保持独立的数组, 不合并为二维块 (分块导入时逐列释放依赖于此)
+    return pd.DataFrame(
+        {col: compact_series(df[col], category_max_ratio, float_rtol) for col in df.columns},
+        index=df.index, copy=False
+    )
+
+
+def _chunk_kind(series):
+    # 块内推断出的列类型大类; 数值类型之间合并不改变取值
+    if series.dtype.kind in 'iuf':
+        return 'number'
+    if _is_text(series):
+        return 'text'
+    return str(series.dtype)
+
+
+def _merge_chunks(chunks, category_max_ratio=CATEGORY_MAX_RATIO, float_rtol=FLOAT32_RTOL):
+    # 逐列合并各块并压缩类型, 合并后即从各块中移除该列, 合并过程只多占用一列的内存
+    # 各块的 category 取值集合不同, 直接 concat 会退化为 object, 因此用 union_categoricals 合并
+    columns = {}
+    for col in list(chunks[0].columns):
+        parts = [chunk.pop(col) for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            merged = pd.Series(union_categoricals(parts), name=col)
+        else:
+            merged = pd.concat(parts, ignore_index=True)
+        del parts
+        columns[col] = compact_series(merged, category_max_ratio, float_rtol)
+    return pd.DataFrame(columns, copy=False)
+
+
+def read_csv_chunked(file_obj, encoding='utf-8', chunksize=DEFAULT_CHUNKSIZE, progress_callback=None):
+    # 分块读取 CSV, 每块读入后立即压缩类型; 合并时逐列进行,
+    # 峰值内存约为压缩后的数据加一个原始块 (读取时) 或一列合并前后的数据 (合并时)
+    total_bytes = file_obj.seek(0, io.SEEK_END) or 1
+    file_obj.seek(0)
+
+    chunks = []
+    kinds = {}
+    original_bytes = 0
+    rows = 0
+    with pd.read_csv(file_obj, encoding=encoding, chunksize=chunksize) as reader:
+        for chunk in reader:
+            original_bytes += int(chunk.memory_usage(deep=True).sum())
+            rows += len(chunk)
+            for col in chunk.columns:
+                kinds.setdefault(col, set()).add(_chunk_kind(chunk[col]))
+            # 单块内的文本列一律先转为 category, 合并后再按整体唯一值占比决定是否保留
+            # (float32 的误差不超过块内取值范围的 FLOAT32_RTOL 倍, 也就不超过整列取值范围的该倍数)
+            chunks.append(compact_frame(chunk, category_max_ratio=1.0))
+            if progress_callback is not None:
+                progress_callback(min(file_obj.tell() / total_bytes, 1.0), rows)
+
+    # 各块推断的类型不一致 (如前面的块全是数字, 后面出现文本) 时, 整体读取会得到文本列;
+    # 这些列按文本重新读取一遍, 保留原始写法 (如 "01", "1.50"), 避免同一个值在合并后变成不同的类别
+    mixed = [col for col, found in kinds.items() if len(found) > 1 and found != {'number'}]
+    if mixed and chunks:
+        file_obj.seek(0)
+        with pd.read_csv(file_obj, encoding=encoding, chunksize=chunksize, usecols=mixed,
+                         dtype={col: str for col in mixed}) as reader:
+            for chunk, text in zip(chunks, reader):
+                for col in mixed:
+                    chunk[col] = compact_series(text[col], category_max_ratio=1.0)
+
+    df = _merge_chunks(chunks) if chunks else pd.DataFrame()
+    report = {
+        'rows': rows,
+        'original_bytes': original_bytes,
+        'compact_bytes': int(df.memory_usage(deep=True).sum())
+    }
+    return df, report
+
+
+def parse_file(file_obj, file_name, encoding='utf-8', sheet_name=0):
+    file_obj.seek(0)
+    if is_csv(file_name):
+        return pd.read_csv(file_obj, encoding=encoding)
+    return pd.read_excel(file_obj, sheet_name=sheet_name)
+
+
+def load_uploaded_file(uploaded_file, encoding='utf-8', sheet_name=0, streaming=False, progress_callback=None):
+    # 编码只影响 CSV, 工作表只影响 Excel, 不相关的一项固定为 None 以提高命中率
+    # 流式导入仅支持 CSV, 返回 (数据集ID, DataFrame, 导入报告), 非流式导入的报告为 None
+    if is_csv(uploaded_file.name):
+        key = (file_digest(uploaded_file), encoding, None, 'stream' if streaming else 'full')
+    else:
+        key = (file_digest(uploaded_file), None, sheet_name, 'full')
+    dataset_id = make_dataset_id(key)
+
+    entry = _parsed_frames.get(dataset_id)
+    if entry is None:
+        if has_dataset(dataset_id):
+            # 其他会话 (或上次启动) 已经转换过该文件, 直接打开内存映射视图
+            entry = (open_dataset(dataset_id), read_dataset_meta(dataset_id)['extra'])
+        else:
+            if key[3] == 'stream':
+                uploaded_file.seek(0)
+                df, report = read_csv_chunked(uploaded_file, encoding=encoding, progress_callback=progress_callback)
+            else:
+                df, report = parse_file(uploaded_file, uploaded_file.name, encoding=encoding, sheet_name=sheet_name), None
+            try:
+                write_dataset(dataset_id, df, extra=report)
+                entry = (open_dataset(dataset_id), report)
+            except OSError:
+                # 存储目录不可写时退回到堆内存中的 DataFrame
+                entry = (df, report)
+        _parsed_frames.put(dataset_id, entry)
+    return dataset_id, entry[0], entry[1]
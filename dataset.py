@@ -0,0 +1,107 @@
+import copy
+import uuid
+
+from table_editor import apply_editor_delta, revert_delta
+
+# 撤销历史的上限: 条目数与日志占用的字节数, 超出时压缩 (丢弃最早的可撤销步骤)
+MAX_HISTORY = 50
+MAX_LOG_BYTES = 256 * 2**20
+
+
+def _delta_bytes(changes):
+    # 撤销信息占用的内存 (估算)
+    size = changes['removed_frame'].memory_usage(index=True, deep=False).sum()
+    size += sum(16 * len(rows) for rows, _ in changes['old_cells'].values())
+    return int(size)
+
+
+class VersionedDataset:
+    # 带版本的数据表: 当前表 + 只追加的增量日志 (单元格、行、列的修改及其原值)
+    # 编辑在当前表上原地进行 (写时复制, 只复制被修改的列), 撤销/重做按日志反向/正向应用增量, 不保存整表副本
+    # 每个版本有全局唯一的版本号 "<谱系>-<序号>", 序号单调递增; 撤销/重做回到的版本沿用原来的版本号,
+    # 渲染、统计等缓存可以直接以版本号为键, 无需对整表求哈希; 由于编辑原地写入列数据,
+    # 以版本号为键的缓存只能保存结果或副本, 不能引用表中的数组 (否则撤销后读到被修改过的数据)
+    def __init__(self, df, base_version=None, shared=False, max_history=MAX_HISTORY, max_log_bytes=MAX_LOG_BYTES):
+        self.lineage = uuid.uuid4().hex
+        self.frame = df
+        # shared: 表与其他会话共享 (如数据集缓存中的表), 首次编辑前需要浅拷贝
+        self.shared = shared
+        self.max_history = max_history
+        self.max_log_bytes = max_log_bytes
+        self._counter = 0
+        self._log = []
+        self._versions = [base_version or f"{self.lineage}-0"]
+        self._position = 0
+
+    @property
+    def version(self):
+        return self._versions[self._position]
+
+    @property
+    def can_undo(self):
+        return self._position > 0
+
+    @property
+    def can_redo(self):
+        return self._position < len(self._log)
+
+    def _next_version(self):
+        self._counter += 1
+        return f"{self.lineage}-{self._counter}"
+
+    def apply_edits(self, start, editor_state, stop=None):
+        # 应用 st.data_editor 的编辑状态 (行位置相对于 start, 新增行插入在 stop 处), 返回变更 (无修改时为 None)
+        editor_state = copy.deepcopy(editor_state)
+        frame, changes = apply_editor_delta(self.frame, start, editor_state, inplace=not self.shared, stop=stop)
+        if changes is None:
+            return None
+        self.frame = frame
+        self.shared = False
+        # 新的编辑使重做分支失效
+        del self._log[self._position:]
+        del self._versions[self._position + 1:]
+        self._log.append({'start': start, 'stop': stop, 'state': editor_state, 'changes': changes,
+                          'bytes': _delta_bytes(changes)})
+        self._versions.append(self._next_version())
+        self._position += 1
+        self.compact()
+        return changes
+
+    def undo(self):
+        if not self.can_undo:
+            return False
+        entry = self._log[self._position - 1]
+        self.frame = revert_delta(self.frame, entry['changes'])
+        self._position -= 1
+        return True
+
+    def redo(self):
+        # 重新应用记录的编辑状态, 同时刷新撤销信息
+        if not self.can_redo:
+            return False
+        entry = self._log[self._position]
+        self.frame, entry['changes'] = apply_editor_delta(self.frame, entry['start'], entry['state'], inplace=True,
+                                                          stop=entry['stop'])
+        self._position += 1
+        return True
+
+    def compact(self):
+        # 丢弃最早的撤销步骤, 直到条目数与字节数都在预算内; 重做分支不受影响
+        drop = 0
+        total = sum(entry['bytes'] for entry in self._log)
+        while drop < self._position and (len(self._log) - drop > self.max_history or total > self.max_log_bytes):
+            total -= self._log[drop]['bytes']
+            drop += 1
+        if drop:
+            del self._log[:drop]
+            del self._versions[:drop]
+            self._position -= drop
+        return drop
+
+    def history_stats(self):
+        return {
+            'version': self.version,
+            'undo': self._position,
+            'redo': len(self._log) - self._position,
+            'log_bytes': sum(entry['bytes'] for entry in self._log)
+        }
@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+import numpy as np
+import pandas as pd
+
+# 列式数据集存储: 每个数据集一个目录, 每列一个 .npy 文件, 以只读内存映射方式打开
+# 同一文件的多个会话共享操作系统的页缓存, 而不是各自在堆上持有一份副本
+STORE_DIR = os.environ.get('PLT_WEBUI_STORE_DIR', os.path.join(tempfile.gettempdir(), 'simple-plt-webui-store'))
+# 最多保留的数据集数量, 超出时按最近使用时间清理
+MAX_DATASETS = 32
+
+_META_FILE = 'meta.json'
+
+
+def make_dataset_id(key):
+    return hashlib.sha256(repr(key).encode('utf-8')).hexdigest()[:32]
+
+
+def _dataset_dir(dataset_id):
+    return os.path.join(STORE_DIR, dataset_id)
+
+
+def has_dataset(dataset_id):
+    return os.path.exists(os.path.join(_dataset_dir(dataset_id), _META_FILE))
+
+
+def list_datasets():
+    if not os.path.isdir(STORE_DIR):
+        return []
+    return sorted(name for name in os.listdir(STORE_DIR) if has_dataset(name))
+
+
+def _write_column(path, index, series):
+    # 数值/布尔/日期列直接保存; 文本与分类列做字典编码 (codes + categories); 其余类型退回 pickle
+    dtype = series.dtype
+    if isinstance(dtype, pd.CategoricalDtype) or dtype == object or pd.api.types.is_string_dtype(dtype):
+        kind = 'category' if isinstance(dtype, pd.CategoricalDtype) else 'text'
+        cat = series.array if kind == 'category' else pd.Categorical(series)
+        categories = cat.categories.tolist()
+        try:
+            json.dumps(categories)
+        except TypeError:
+            kind = 'pickle'
+        else:
+            np.save(os.path.join(path, f'c{index}.npy'), np.asarray(cat.codes))
+            return {'kind': kind, 'categories': categories, 'ordered': bool(cat.ordered),
+                    'dtype': str(dtype) if kind == 'text' else None}
+    elif isinstance(dtype, np.dtype) and dtype.kind in 'biufcmM':
+        np.save(os.path.join(path, f'c{index}.npy'), series.to_numpy())
+        return {'kind': 'array'}
+    else:
+        kind = 'pickle'
+
+    series.to_pickle(os.path.join(path, f'c{index}.pkl'))
+    return {'kind': kind}
+
+
+def write_dataset(dataset_id, df, extra=None):
+    # 先写入临时目录再原子重命名, 并发写入同一数据集时以先完成者为准
+    os.makedirs(STORE_DIR, exist_ok=True)
+    target = _dataset_dir(dataset_id)
+    if has_dataset(dataset_id):
+        return
+    tmp_dir = os.path.join(STORE_DIR, f'.tmp-{uuid.uuid4().hex}')
+    os.makedirs(tmp_dir)
+    try:
+        columns = []
+        for i, col in enumerate(df.columns):
+            entry = _write_column(tmp_dir, i, df[col])
+            entry['name'] = col
+            columns.append(entry)
+        meta = {'rows': len(df), 'columns': columns, 'extra': extra}
+        with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False, default=str)
+        try:
+            os.replace(tmp_dir, target)
+        except OSError:
+            if not has_dataset(dataset_id):
+                raise
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    prune_store()
+
+
+def read_dataset_meta(dataset_id):
+    with open(os.path.join(_dataset_dir(dataset_id), _META_FILE), encoding='utf-8') as f:
+        return json.load(f)
+
+
+def open_dataset(dataset_id):
+    # 数值列为只读 np.memmap, 通过 copy=False 交给 DataFrame, 不产生堆上副本
+    path = _dataset_dir(dataset_id)
+    meta = read_dataset_meta(dataset_id)
+    os.utime(os.path.join(path, _META_FILE))
+
+    columns = {}
+    for i, entry in enumerate(meta['columns']):
+        kind = entry['kind']
+        if kind == 'array':
+            columns[entry['name']] = np.load(os.path.join(path, f'c{i}.npy'), mmap_mode='r')
+        elif kind in ('category', 'text'):
+            codes = np.load(os.path.join(path, f'c{i}.npy'), mmap_mode='r')
+            cat = pd.Categorical.from_codes(codes, categories=entry['categories'], ordered=entry['ordered'])
+            if kind == 'text':
+                # 文本列无法零拷贝, 按原始类型还原以保持可编辑
+                columns[entry['name']] = pd.Series(cat).astype(entry['dtype'])
+            else:
+                columns[entry['name']] = pd.Series(cat)
+        else:
+            columns[entry['name']] = pd.read_pickle(os.path.join(path, f'c{i}.pkl'))
+
+    if not columns:
+        return pd.DataFrame(index=pd.RangeIndex(meta['rows']))
+    return pd.DataFrame(columns, copy=False)
+
+
+def prune_store(max_datasets=MAX_DATASETS):
+    # 已被映射的文件在 POSIX 下删除后仍然有效; Windows 下删除失败则留待下次清理
+    datasets = list_datasets()
+    if len(datasets) <= max_datasets:
+        return
+    datasets.sort(key=lambda name: os.path.getmtime(os.path.join(_dataset_dir(name), _META_FILE)))
+    for name in datasets[:len(datasets) - max_datasets]:
+        shutil.rmtree(_dataset_dir(name), ignore_errors=True)
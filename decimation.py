@@ -0,0 +1,72 @@
+import numpy as np
+
+# 降采样方法
+DECIMATION_METHODS = ['minmax', 'lttb']
+
+
+def is_monotonic(x):
+    return len(x) < 2 or bool(np.all(x[1:] >= x[:-1]))
+
+
+def minmax_decimate(x, y, pixels):
+    # M4 降采样: 按像素列把 x 等宽分桶, 每桶保留首点、末点、最小值点和最大值点
+    # 在该像素宽度下绘制的折线与原始数据逐像素一致, 峰值不会丢失; 要求 x 单调不减
+    n = len(x)
+    if n == 0 or pixels < 1:
+        return x, y
+    edges = np.linspace(x[0], x[-1], pixels + 1)
+    starts = np.searchsorted(x, edges[:-1], side='left')
+    starts = np.unique(np.append(starts[starts < n], 0))
+    counts = np.diff(np.append(starts, n))
+
+    index = np.arange(n)
+    y_min = np.fmin.reduceat(y, starts)
+    y_max = np.fmax.reduceat(y, starts)
+    # 每桶中第一个等于最小值/最大值的位置; 全为 NaN 的桶得到 n, 随后被过滤
+    i_min = np.minimum.reduceat(np.where(y == np.repeat(y_min, counts), index, n), starts)
+    i_max = np.minimum.reduceat(np.where(y == np.repeat(y_max, counts), index, n), starts)
+    last = starts + counts - 1
+
+    keep = np.unique(np.concatenate([starts, last, i_min, i_max]))
+    keep = keep[keep < n]
+    return x[keep], y[keep]
+
+
+def lttb_decimate(x, y, n_out):
+    # Largest-Triangle-Three-Buckets: 每桶选取与相邻桶构成三角形面积最大的点, 视觉形状保持较好
+    # NaN 点会被移除; 要求 x 单调不减
+    valid = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[valid], y[valid]
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return x, y
+
+    bucket_edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    keep = np.empty(n_out, dtype=np.int64)
+    keep[0] = 0
+    keep[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        start, end = bucket_edges[i], bucket_edges[i + 1]
+        next_end = bucket_edges[i + 2] if i + 2 < n_out - 1 else n
+        next_x = x[end:next_end].mean() if next_end > end else x[-1]
+        next_y = y[end:next_end].mean() if next_end > end else y[-1]
+        area = np.abs((x[prev] - next_x) * (y[start:end] - y[prev])
+                      - (x[prev] - x[start:end]) * (next_y - y[prev]))
+        prev = start + int(np.argmax(area))
+        keep[i + 1] = prev
+    return x[keep], y[keep]
+
+
+def decimate(x, y, pixels, method='minmax'):
+    # 按绘图区像素宽度降采样, 点数不足以受益时原样返回
+    # minmax 每像素最多 4 个点, lttb 每像素 2 个点
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=float)
+    if method == 'lttb':
+        if len(x) <= 2 * pixels:
+            return x, y
+        return lttb_decimate(x.astype(float), y, 2 * pixels)
+    if len(x) <= 4 * pixels:
+        return x, y
+    return minmax_decimate(x, y, pixels)
@@ -0,0 +1,90 @@
+import io
+import os
+import sys
+import threading
+import weakref
+from contextlib import contextmanager
+
+from matplotlib.collections import Collection
+from matplotlib.figure import Figure
+from matplotlib.lines import Line2D
+
+# 通过 managed_figure 创建且尚未被回收的 Figure
+_live_figures = weakref.WeakSet()
+_counter_lock = threading.Lock()
+_counters = {'created': 0, 'released': 0}
+
+
+@contextmanager
+def managed_figure(figsize=None, dpi=None):
+    # 直接创建 Figure 而不经过 pyplot, 不会注册到全局的图形管理器, 也不依赖"当前图形"
+    # 退出时 (包括绘图出错时) 清空 Figure, 解除对数据和 Artist 的引用
+    fig = Figure(figsize=figsize, dpi=dpi)
+    ax = fig.subplots()
+    _live_figures.add(fig)
+    with _counter_lock:
+        _counters['created'] += 1
+    try:
+        yield fig, ax
+    finally:
+        fig.clear()
+        with _counter_lock:
+            _counters['released'] += 1
+
+
+def figure_to_bytes(fig, format='png', **kwargs):
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=format, **kwargs)
+    return buffer.getvalue()
+
+
+def _point_count(artist):
+    if isinstance(artist, Line2D):
+        return len(artist.get_xydata())
+    if isinstance(artist, Collection):
+        return len(artist.get_offsets()) + sum(len(path.vertices) for path in artist.get_paths())
+    return 0
+
+
+def rasterize_dense_artists(fig, max_points):
+    # 矢量格式 (SVG/PDF) 中点数超过 max_points 的折线、散点与填充区域以位图嵌入 (分辨率为保存时的 DPI),
+    # 坐标轴、文字等仍为矢量, 文件大小与写入耗时不再随数据点数增长; 返回被栅格化的图层数
+    count = 0
+    for ax in fig.axes:
+        for artist in [*ax.lines, *ax.collections]:
+            if not artist.get_rasterized() and _point_count(artist) > max_points:
+                artist.set_rasterized(True)
+                count += 1
+    return count
+
+
+def resident_memory():
+    # 当前进程的常驻内存 (字节), 无法获取时返回 None
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def _pyplot_figure_count():
+    # 仅在 pyplot 已被导入时统计, 避免为诊断而引入 pyplot 的全局状态
+    pyplot = sys.modules.get('matplotlib.pyplot')
+    return len(pyplot.get_fignums()) if pyplot is not None else 0
+
+
+def figure_stats():
+    with _counter_lock:
+        counters = dict(_counters)
+    return {
+        'pyplot_figures': _pyplot_figure_count(),
+        'live_figures': len(_live_figures),
+        'created': counters['created'],
+        'released': counters['released'],
+        'rss_bytes': resident_memory()
+    }
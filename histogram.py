@@ -0,0 +1,72 @@
+import numpy as np
+
+from cache import LRUCache, array_digest
+
+# 细粒度基础直方图的分箱数: 1~12 的最小公倍数, 常用的分箱数大多能整除它
+BASE_BINS = 27720
+
+# 直方图缓存: (数据版本, 列, 分箱数, 范围) -> (计数, 边界)
+_hist_cache = LRUCache(max_entries=64)
+
+
+def _finite_values(values):
+    values = np.asarray(values, dtype=float)
+    return values[np.isfinite(values)]
+
+
+def histogram_range(values):
+    # 与 np.histogram 的默认范围一致; 所有值相同时向两侧各扩展 0.5
+    if not len(values):
+        return 0.0, 1.0
+    low, high = float(values.min()), float(values.max())
+    if low == high:
+        return low - 0.5, high + 0.5
+    return low, high
+
+
+def _base_histogram(values, data_version, column, hist_range):
+    key = (data_version, column, 'base', hist_range)
+    entry = _hist_cache.get(key)
+    if entry is None:
+        entry = np.histogram(values(), bins=BASE_BINS, range=hist_range)
+        _hist_cache.put(key, entry)
+    return entry
+
+
+def histogram_counts(series, bins, hist_range=None, data_version=None, use_base=False):
+    # 返回 (计数, 边界), 忽略 NaN 与 ±inf
+    # 按 (数据版本, 列, 分箱数, 范围) 缓存; 无数据版本时按列内容计算缓存键
+    # use_base 时先计算 BASE_BINS 个分箱的基础直方图, 分箱数能整除 BASE_BINS 时直接合并基础分箱,
+    # 拖动分箱数滑块不再重新扫描数据; 否则与 np.histogram 的结果完全一致
+    column = series.name
+    if data_version is None:
+        data_version = array_digest(series.to_numpy())
+
+    range_key = (data_version, column, 'range', hist_range)
+    resolved = _hist_cache.get(range_key)
+    finite = None
+    if resolved is None:
+        finite = _finite_values(series)
+        resolved = hist_range if hist_range is not None else histogram_range(finite)
+        _hist_cache.put(range_key, resolved)
+
+    key = (data_version, column, bins, resolved)
+    entry = _hist_cache.get(key)
+    if entry is not None:
+        return entry
+
+    def values():
+        return finite if finite is not None else _finite_values(series)
+
+    if use_base and BASE_BINS % bins == 0:
+        base_counts, base_edges = _base_histogram(values, data_version, column, resolved)
+        # 每个分箱由相邻的 BASE_BINS // bins 个基础分箱合并而成, 边界取基础边界的子集
+        # 基础边界与等分边界可能相差舍入误差, 恰好落在边界上的值可能被归入相邻分箱
+        # 整数列大量取值恰在边界上, 因此仅在边界完全重合时使用基础直方图
+        edges = base_edges[::BASE_BINS // bins]
+        if series.dtype.kind not in 'iub' or np.array_equal(edges, np.linspace(resolved[0], resolved[1], bins + 1)):
+            entry = (base_counts.reshape(bins, -1).sum(axis=1), edges)
+    if entry is None:
+        entry = np.histogram(values(), bins=bins, range=resolved)
+    _hist_cache.put(key, entry)
+    return entry
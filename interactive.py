@@ -0,0 +1,124 @@
+import numpy as np
+import pandas as pd
+
+from cache import LRUCache, array_digest
+from decimation import decimate, is_monotonic
+
+# 浏览器端交互预览 (Vega-Lite): 服务端只准备降采样后的长表, 缩放、平移与悬停提示都在浏览器中完成
+INTERACTIVE_PLOT_TYPES = ["Line Plot (折线图)", "Scatter Plot (散点图)", "Area Chart (面积图)"]
+# 按该像素宽度降采样 (与浏览器中图表的宽度相当)
+INTERACTIVE_PIXELS = 1200
+# 无法按像素降采样 (散点图、x 不单调或非数值) 时每个序列最多发送的点数
+MAX_SAMPLE_POINTS = 20_000
+
+# 预览数据缓存: (数据版本, 图表类型, x 列, y 列, 像素宽度) -> (长表, 降采样记录)
+_payload_cache = LRUCache(max_entries=None, max_bytes=128 * 2**20,
+                          sizeof=lambda entry: int(entry[0].memory_usage(index=False).sum()))
+
+
+def _sample(x, y, plot_type, pixels):
+    # 折线/面积图在 x 为单调数值时按像素降采样 (保留峰值), 其余情况等间隔抽样
+    if plot_type != "Scatter Plot (散点图)" and x.dtype.kind in 'iuf' and y.dtype.kind in 'iuf' and is_monotonic(x):
+        return decimate(x, y, pixels, 'minmax')
+    if len(x) > MAX_SAMPLE_POINTS:
+        index = np.linspace(0, len(x) - 1, MAX_SAMPLE_POINTS).astype(np.intp)
+        return x[index], y[index]
+    return x, y
+
+
+def interactive_payload(df, x_col, y_cols, plot_type, data_version=None, pixels=INTERACTIVE_PIXELS):
+    # 返回 (长表 [x, series, y], 降采样记录 [(列名, 原始点数, 发送点数)])
+    if data_version is None:
+        data_version = array_digest(*(df[col].to_numpy() for col in [x_col, *y_cols]))
+    key = (data_version, plot_type, x_col, tuple(y_cols), pixels)
+    entry = _payload_cache.get(key)
+    if entry is not None:
+        return entry
+
+    x_all = df[x_col].to_numpy()
+    frames = []
+    decimation = []
+    for col in y_cols:
+        y_all = df[col].to_numpy()
+        if y_all.dtype.kind not in 'iuf':
+            continue
+        x, y = _sample(x_all, y_all, plot_type, pixels)
+        if len(x) < len(x_all):
+            decimation.append((col, len(x_all), len(x)))
+        frames.append(pd.DataFrame({'x': x, 'series': str(col), 'y': y}))
+    if frames:
+        payload = pd.concat(frames, ignore_index=True)
+    else:
+        payload = pd.DataFrame({'x': x_all[:0], 'series': pd.Series(dtype=str), 'y': np.empty(0)})
+    payload['series'] = payload['series'].astype('category')
+    entry = (payload, decimation)
+    _payload_cache.put(key, entry)
+    return entry
+
+
+def _scale(log, invert, low, high):
+    scale = {'zero': False}
+    if log:
+        scale['type'] = 'log'
+    if invert:
+        scale['reverse'] = True
+    # 与 Matplotlib 预览相同: 留空的范围自动确定, 无法解析的输入忽略
+    for name, text in (('domainMin', low), ('domainMax', high)):
+        try:
+            scale[name] = float(text)
+        except (TypeError, ValueError):
+            pass
+    return scale
+
+
+def _legend(spec):
+    # Matplotlib 的图例位置对应到 Vega-Lite 的图例方位, 'best' 与居中类位置放在图外右侧
+    if not spec.show_legend:
+        return None
+    vertical = 'bottom' if 'lower' in spec.legend_loc else 'top' if 'upper' in spec.legend_loc else None
+    horizontal = 'right' if 'right' in spec.legend_loc else 'left' if 'left' in spec.legend_loc else None
+    if vertical and horizontal:
+        return {'orient': f"{vertical}-{horizontal}"}
+    return {'orient': vertical or horizontal or 'right'}
+
+
+def vega_lite_spec(spec, x_kind):
+    # 由 PlotSpec 生成 Vega-Lite 规格; 数据由 st.vega_lite_chart 以 Arrow 列式格式单独发送
+    dash = {'-': [], '--': [6, 4], '-.': [6, 3, 2, 3], ':': [2, 3], '': []}.get(spec.line_style_val, [])
+    if spec.plot_type == "Scatter Plot (散点图)":
+        mark = {'type': 'point', 'filled': True, 'size': spec.marker_size, 'opacity': spec.alpha}
+    elif spec.plot_type == "Area Chart (面积图)":
+        mark = {'type': 'area', 'opacity': spec.alpha, 'line': True}
+    else:
+        mark = {'type': 'line', 'strokeWidth': spec.line_width, 'strokeDash': dash, 'opacity': spec.alpha,
+                'point': bool(spec.marker_style_val)}
+        if not spec.line_style_val:
+            mark['strokeOpacity'] = 0
+    mark['clip'] = True
+
+    x_type = 'quantitative' if x_kind in 'iuf' else 'temporal' if x_kind == 'M' else 'ordinal'
+    x_encoding = {'field': 'x', 'type': x_type, 'title': spec.x_label or spec.x_col,
+                  'axis': {'grid': spec.show_grid}}
+    if x_type == 'quantitative':
+        x_encoding['scale'] = _scale(spec.log_x, spec.invert_x, spec.x_min, spec.x_max)
+    y_encoding = {'field': 'y', 'type': 'quantitative', 'title': spec.y_label, 'axis': {'grid': spec.show_grid},
+                  'scale': _scale(spec.log_y, spec.invert_y, spec.y_min, spec.y_max)}
+    if spec.plot_type == "Area Chart (面积图)":
+        # 与 Matplotlib 的 fill_between 相同, 各序列不堆叠
+        y_encoding['stack'] = None
+
+    return {
+        'title': spec.plot_title,
+        'mark': mark,
+        'encoding': {
+            'x': x_encoding,
+            'y': y_encoding,
+            'color': {'field': 'series', 'type': 'nominal', 'title': None, 'legend': _legend(spec)},
+            'tooltip': [{'field': 'series', 'type': 'nominal'},
+                        {'field': 'x', 'type': x_type, 'title': str(spec.x_col)},
+                        {'field': 'y', 'type': 'quantitative'}]
+        },
+        # 坐标轴绑定到区间选择: 在浏览器中拖动平移、滚轮缩放, 双击复原
+        'params': [{'name': 'view', 'select': 'interval', 'bind': 'scales'}],
+        'config': {'font': spec.font_family}
+    }
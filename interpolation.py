@@ -0,0 +1,40 @@
+import numpy as np
+from scipy import interpolate
+
+from cache import LRUCache, array_digest
+from decimation import is_monotonic
+
+# 插值结果缓存的字节预算
+INTERP_CACHE_BYTES = 64 * 2**20
+
+# 插值结果缓存: (数据哈希, 插值方式, 倍数) -> (x_new, y_new)
+_interp_cache = LRUCache(max_entries=None, max_bytes=INTERP_CACHE_BYTES,
+                         sizeof=lambda entry: entry[0].nbytes + entry[1].nbytes)
+
+
+def _fit(x, y, kind, factor):
+    # 直接在 NumPy 数组上拟合, x 已单调时跳过排序
+    if not is_monotonic(x):
+        order = np.argsort(x)
+        x = x[order]
+        y = y[order]
+    x_new = np.linspace(x.min(), x.max(), len(x) * factor)
+    if kind == 'spline':
+        # 使用 B-Spline
+        t, c, k = interpolate.splrep(x, y, s=0, k=3)
+        bspline = interpolate.BSpline(t, c, k, extrapolate=False)
+        return x_new, bspline(x_new)
+    f = interpolate.interp1d(x, y, kind=kind)
+    return x_new, f(x_new)
+
+
+def interpolate_series(x_data, y_data, kind='linear', factor=5):
+    # 返回平滑曲线 (x_new, y_new), 按数据内容缓存, 标题等无关参数变化时不会重新拟合
+    x = np.asarray(x_data)
+    y = np.asarray(y_data)
+    key = (array_digest(x, y), kind, factor)
+    entry = _interp_cache.get(key)
+    if entry is None:
+        entry = _fit(x, y, kind, factor)
+        _interp_cache.put(key, entry)
+    return entry
@@ -0,0 +1,83 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy import signal
+
+from cache import LRUCache, array_digest
+
+# 寻峰线程数; find_peaks 的主要计算在 C 代码中进行, 多列可以并行
+PEAK_WORKERS = min(8, os.cpu_count() or 1)
+
+# 寻峰结果缓存: (数据哈希或 (数据版本, 列名), 突出度, 宽度) -> (峰值位置, 突出度, 宽度)
+_peak_cache = LRUCache(max_entries=512)
+
+
+def _find(y, prominence, width):
+    peaks, properties = signal.find_peaks(y, prominence=prominence, width=width)
+    return peaks, properties['prominences'], properties['widths']
+
+
+def detect_peaks(y_data, prominence=0.1, width=0.0, digest=None):
+    # 单列寻峰, 返回 (峰值位置, 突出度, 宽度), 按数据内容与参数缓存
+    # digest 为调用方已有的数据标识, 提供时不再对数据求哈希
+    y = np.asarray(y_data)
+    key = (digest if digest is not None else array_digest(y), prominence, width)
+    entry = _peak_cache.get(key)
+    if entry is None:
+        entry = _find(y, prominence, width)
+        _peak_cache.put(key, entry)
+    return entry
+
+
+def detect_peaks_batch(y_arrays, prominence=0.1, width=0.0, digests=None, max_workers=PEAK_WORKERS):
+    # 多列一起寻峰: 先查缓存, 未命中的列在线程池中并行计算
+    # digests 为与 y_arrays 等长的数据标识 (如 (数据版本, 列名)), 未提供时每列求一次哈希
+    # 返回与 y_arrays 等长的结果列表, 某列失败时对应位置为异常对象
+    y_arrays = [np.asarray(y) for y in y_arrays]
+    if digests is None:
+        digests = [array_digest(y) for y in y_arrays]
+    keys = [(digest, prominence, width) for digest in digests]
+    results = [_peak_cache.get(key) for key in keys]
+    missing = [i for i, entry in enumerate(results) if entry is None]
+
+    def run(i):
+        try:
+            return _find(y_arrays[i], prominence, width)
+        except Exception as e:
+            return e
+
+    if len(missing) > 1 and max_workers > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            computed = list(executor.map(run, missing))
+    else:
+        computed = [run(i) for i in missing]
+    for i, entry in zip(missing, computed):
+        if not isinstance(entry, Exception):
+            _peak_cache.put(keys[i], entry)
+        results[i] = entry
+    return results
+
+
+def peak_table(df, x_col, y_cols, prominence=0.1, width=0.0, data_version=None):
+    # 所有选中列的峰值汇总表, 用于下载; 有数据版本时与绘图共用寻峰缓存, 不再对数据求哈希
+    digests = [(data_version, col) for col in y_cols] if data_version is not None else None
+    results = detect_peaks_batch([df[col] for col in y_cols], prominence, width, digests)
+    x = df[x_col].to_numpy()
+    frames = []
+    for col, entry in zip(y_cols, results):
+        if isinstance(entry, Exception):
+            continue
+        peaks, prominences, widths = entry
+        frames.append(pd.DataFrame({
+            'series': col,
+            'index': peaks,
+            'x': x[peaks],
+            'y': df[col].to_numpy()[peaks],
+            'prominence': prominences,
+            'width': widths
+        }))
+    if not frames:
+        return pd.DataFrame(columns=['series', 'index', 'x', 'y', 'prominence', 'width'])
+    return pd.concat(frames, ignore_index=True)
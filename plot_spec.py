@@ -0,0 +1,131 @@
+import json
+from dataclasses import asdict, dataclass, field, fields
+
+from correlation import ANNOTATION_BUDGET, HEATMAP_ORDERS
+from decimation import DECIMATION_METHODS
+
+PLOT_TYPES = [
+    "Line Plot (折线图)",
+    "Scatter Plot (散点图)",
+    "Bar Chart (柱状图)",
+    "Histogram (直方图)",
+    "Box Plot (箱线图)",
+    "Pie Chart (饼图)",
+    "Area Chart (面积图)",
+    "Violin Plot (小提琴图)",
+    "Correlation Heatmap (相关性热力图)"
+]
+
+# draw_plot_content 接受的绘图参数
+DRAW_FIELDS = (
+    'marker_style_val', 'line_style_val', 'line_width', 'marker_size', 'alpha', 'font_size',
+    'bins', 'hist_base',
+    'enable_interp', 'interp_kind', 'interp_factor',
+    'enable_peaks', 'peak_prominence', 'peak_width',
+    'enable_linreg', 'show_linreg_eq', 'show_linreg_r2', 'show_linreg_p_value', 'show_linreg_str_err',
+    'extra_axes',
+    'enable_decimation', 'decimation_method',
+    'enable_density', 'density_threshold',
+    'heatmap_order', 'heatmap_top_k', 'heatmap_annot_threshold', 'heatmap_annot_budget'
+)
+
+# generate_plot_code 不使用的参数
+_CODE_EXCLUDED = ('hist_base', 'fig_width', 'fig_height', 'dpi', 'custom_rc')
+
+
+@dataclass
+class PlotSpec:
+    # 一张图的全部参数, 可序列化为 JSON; WebUI 侧边栏、渲染服务与批量渲染共用
+    plot_type: str = PLOT_TYPES[0]
+    x_col: object = None
+    y_cols: list = field(default_factory=list)
+
+    # 样式
+    marker_style_val: str = 'o'
+    line_style_val: str = '-'
+    line_width: float = 1.5
+    marker_size: float = 50
+    alpha: float = 0.8
+    font_size: int = 12
+
+    # 各图表类型的参数
+    bins: int = 20
+    hist_base: bool = False
+    enable_interp: bool = False
+    interp_kind: str = 'linear'
+    interp_factor: int = 5
+    enable_peaks: bool = False
+    peak_prominence: float = 0.1
+    peak_width: float = 0.0
+    enable_linreg: bool = False
+    show_linreg_eq: bool = True
+    show_linreg_r2: bool = True
+    show_linreg_p_value: bool = False
+    show_linreg_str_err: bool = False
+    extra_axes: list = field(default_factory=list)
+    enable_decimation: bool = True
+    decimation_method: str = DECIMATION_METHODS[0]
+    enable_density: bool = True
+    density_threshold: int = 100_000
+    heatmap_order: str = HEATMAP_ORDERS[0]
+    heatmap_top_k: int = 20
+    heatmap_annot_threshold: float = 0.0
+    heatmap_annot_budget: int = ANNOTATION_BUDGET
+
+    # 标题与坐标轴
+    plot_title: str = "Experiment Results"
+    x_label: str = ""
+    y_label: str = ""
+    show_grid: bool = True
+    show_legend: bool = True
+    legend_loc: str = 'best'
+    log_x: bool = False
+    log_y: bool = False
+    invert_x: bool = False
+    invert_y: bool = False
+    x_min: str = ""
+    x_max: str = ""
+    y_min: str = ""
+    y_max: str = ""
+
+    # 画布与 rcParams
+    theme_style: str = 'default'
+    font_family: str = 'SimHei'
+    fig_width: float = 10
+    fig_height: float = 6
+    dpi: int = 100
+    custom_rc: str = ""
+
+    def __post_init__(self):
+        if self.plot_type not in PLOT_TYPES:
+            raise ValueError(f"未知的图表类型: {self.plot_type}")
+        self.y_cols = list(self.y_cols)
+        self.extra_axes = [dict(axis) for axis in self.extra_axes]
+
+    @classmethod
+    def from_dict(cls, data):
+        # 缺少的参数取默认值, 未知参数视为错误
+        names = {f.name for f in fields(cls)}
+        unknown = sorted(set(data) - names)
+        if unknown:
+            raise ValueError(f"未知的绘图参数: {', '.join(unknown)}")
+        return cls(**data)
+
+    @classmethod
+    def from_json(cls, text):
+        return cls.from_dict(json.loads(text))
+
+    def to_dict(self):
+        return asdict(self)
+
+    def to_json(self, **kwargs):
+        return json.dumps(self.to_dict(), ensure_ascii=False, **kwargs)
+
+    def draw_kwargs(self):
+        return {name: getattr(self, name) for name in DRAW_FIELDS}
+
+    def code_kwargs(self):
+        # generate_plot_code 的关键字参数 (不含数据)
+        kwargs = {f.name: getattr(self, f.name) for f in fields(self) if f.name not in _CODE_EXCLUDED}
+        kwargs['decimation_pixels'] = int(self.fig_width * self.dpi)
+        return kwargs
@@ -1,108 +1,272 @@
-import streamlit as st
+import matplotlib
 import numpy as np
-import matplotlib.pyplot as plt
-from scipy import interpolate, signal, stats
-
-def _plot_single_series(ax, x_data, y_data, label, 
-                      marker_style_val, line_style_val, line_width, marker_size, alpha,
-                      enable_interp, interp_kind, interp_factor,
-                      enable_peaks, peak_prominence, peak_width,
-                      enable_linreg, show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err):
-    # 插值处理
+from matplotlib.colors import LogNorm
+from correlation import annotation_mask, correlation_matrix, heatmap_layout, order_columns
+from decimation import decimate, is_monotonic
+from histogram import histogram_counts
+from interpolation import interpolate_series
+from peaks import detect_peaks_batch
+from regression import linear_fits
+
+def _warn(ax, message):
+    # 警告记录在 Figure 上, 由调用方统一展示 (渲染结果可能来自缓存, 不能在绘图时直接输出)
+    fig = ax.figure
+    if not hasattr(fig, 'render_warnings'):
+        fig.render_warnings = []
+    fig.render_warnings.append(message)
+
+def _note(ax, message):
+    # 提示信息 (非错误), 同样由调用方展示
+    fig = ax.figure
+    if not hasattr(fig, 'render_notes'):
+        fig.render_notes = []
+    fig.render_notes.append(message)
+
+def _decimated(x_data, y_data, label, enable_decimation, decimation_method, decimation_pixels):
+    # 仅对数值型且单调的 x 降采样, 寻峰与回归仍使用完整数据
+    # 返回 (x, y, 降采样记录), 记录为 (序列, 原始点数, 绘制点数), 未降采样时为 None
+    if not enable_decimation:
+        return x_data, y_data, None
+    x = np.asarray(x_data)
+    y = np.asarray(y_data)
+    if x.dtype.kind not in 'iuf' or y.dtype.kind not in 'iuf' or not is_monotonic(x):
+        return x_data, y_data, None
+    x_out, y_out = decimate(x, y, decimation_pixels, decimation_method)
+    if len(x_out) < len(x):
+        return x_out, y_out, (label, len(x), len(x_out))
+    return x_data, y_data, None
+
+def _record_decimation(ax, record):
+    if record is None:
+        return
+    fig = ax.figure
+    if not hasattr(fig, 'decimation_info'):
+        fig.decimation_info = []
+    fig.decimation_info.append(record)
+
+def _prepare_series(x_data, y_data, label, enable_interp, interp_kind, interp_factor,
+                    enable_decimation, decimation_method, decimation_pixels):
+    # 一个折线序列的绘图数据: 'smooth' 为插值曲线, 'raw' 为原始点 (均已降采样), 'error' 为插值失败的异常
+    series = {'smooth': None, 'error': None}
     if enable_interp and len(x_data) > 3:
         try:
-            # 确保数据排序
-            sorted_indices = np.argsort(x_data)
-            x_sorted = x_data.iloc[sorted_indices]
-            y_sorted = y_data.iloc[sorted_indices]
-            
-            if interp_kind == 'spline':
-                # 使用 B-Spline
-                t, c, k = interpolate.splrep(x_sorted, y_sorted, s=0, k=3)
-                x_new = np.linspace(x_sorted.min(), x_sorted.max(), len(x_sorted) * interp_factor)
-                bspline = interpolate.BSpline(t, c, k, extrapolate=False)
-                y_new = bspline(x_new)
-            else:
-                f = interpolate.interp1d(x_sorted, y_sorted, kind=interp_kind)
-                x_new = np.linspace(x_sorted.min(), x_sorted.max(), len(x_sorted) * interp_factor)
-                y_new = f(x_new)
-            
-            ax.plot(x_new, y_new, 
-                    marker='', linestyle=line_style_val, 
-                    linewidth=line_width, label=f"{label} (smooth)", alpha=alpha)
-            # 原始点
-            ax.scatter(x_data, y_data, marker=marker_style_val, s=marker_size/5, alpha=0.5)
+            # 拟合结果按数据内容缓存
+            x_new, y_new = interpolate_series(x_data, y_data, interp_kind, interp_factor)
+            series['smooth'] = _decimated(x_new, y_new, f"{label} (smooth)",
+                                          enable_decimation, decimation_method, decimation_pixels)
         except Exception as e:
-            st.warning(f"插值失败 ({label}): {e}")
-            ax.plot(x_data, y_data, 
-                    marker=marker_style_val, linestyle=line_style_val, 
-                    linewidth=line_width, markersize=marker_size/5,
-                    label=label, alpha=alpha)
+            series['error'] = e
+    series['raw'] = _decimated(x_data, y_data, label, enable_decimation, decimation_method, decimation_pixels)
+    return series
+
+# 密度模式下各序列使用的色图, 空白格子透明, 多个序列可以叠加
+DENSITY_CMAPS = ['Blues', 'Oranges', 'Greens', 'Reds', 'Purples', 'Greys']
+
+def density_counts(x, y, bins):
+    # 散点的二维网格计数 (忽略非有限值), 返回 (计数, x 边界, y 边界)
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    mask = np.isfinite(x) & np.isfinite(y)
+    return np.histogram2d(x[mask], y[mask], bins=bins)
+
+def draw_density(ax, density, label, cmap, alpha):
+    counts, x_edges, y_edges = density
+    im = ax.imshow(np.ma.masked_equal(counts.T, 0), origin='lower', aspect='auto',
+                   extent=(x_edges[0], x_edges[-1], y_edges[0], y_edges[-1]),
+                   cmap=cmap, norm=LogNorm(), alpha=alpha, interpolation='nearest')
+    # 图像没有图例句柄, 用一个空的散点作为图例代理
+    ax.scatter([], [], marker='s', color=matplotlib.colormaps[cmap](0.7), label=label)
+    return im
+
+def density_image(ax, x, y, label, cmap, bins, alpha):
+    # 将散点按二维网格计数后作为一张图像绘制, 绘制耗时与点数无关
+    return draw_density(ax, density_counts(x, y, bins), label, cmap, alpha)
+
+def _plot_scatter_series(ax, x_data, y_data, label, index,
+                         marker_style_val, marker_size, alpha, density):
+    # density 为预先计算的网格计数 (点数超过阈值时) 或计数失败的异常, 返回绘制的图像 (散点模式返回 None)
+    if isinstance(density, Exception):
+        _warn(ax, f"密度图绘制失败 ({label}): {density}")
+    elif density is not None:
+        try:
+            return draw_density(ax, density, label, DENSITY_CMAPS[index % len(DENSITY_CMAPS)], alpha)
+        except Exception as e:
+            _warn(ax, f"密度图绘制失败 ({label}): {e}")
+    ax.scatter(x_data, y_data, 
+               marker=marker_style_val, s=marker_size, 
+               label=label, alpha=alpha)
+    return None
+
+def _plot_single_series(ax, x_data, y_data, label, series,
+                        marker_style_val, line_style_val, line_width, marker_size, alpha,
+                        enable_peaks, enable_linreg, show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err,
+                        peak_result=None, linreg_fit=None):
+    # series 为 _prepare_series 的结果, peak_result 为 detect_peaks_batch 中该列的结果
+    if series['smooth'] is not None:
+        x_new, y_new, record = series['smooth']
+        _record_decimation(ax, record)
+        ax.plot(x_new, y_new, 
+                marker='', linestyle=line_style_val, 
+                linewidth=line_width, label=f"{label} (smooth)", alpha=alpha)
+        # 原始点
+        x_raw, y_raw, record = series['raw']
+        _record_decimation(ax, record)
+        ax.scatter(x_raw, y_raw, marker=marker_style_val, s=marker_size/5, alpha=0.5)
     else:
-        ax.plot(x_data, y_data, 
+        if series['error'] is not None:
+            _warn(ax, f"插值失败 ({label}): {series['error']}")
+        x_plot, y_plot, record = series['raw']
+        _record_decimation(ax, record)
+        ax.plot(x_plot, y_plot, 
                 marker=marker_style_val, linestyle=line_style_val, 
                 linewidth=line_width, markersize=marker_size/5,
                 label=label, alpha=alpha)
     
     # 寻峰处理
     if enable_peaks:
-        try:
-            peaks, _ = signal.find_peaks(y_data, prominence=peak_prominence, width=peak_width)
+        if isinstance(peak_result, Exception):
+            _warn(ax, f"寻峰失败 ({label}): {peak_result}")
+        elif peak_result is not None:
+            peaks = peak_result[0]
             if len(peaks) > 0:
                 ax.plot(x_data.iloc[peaks], y_data.iloc[peaks], "x", color='red', markersize=10, label=f"{label} peaks")
-        except Exception as e:
-            st.warning(f"寻峰失败 ({label}): {e}")
 
     # 线性回归
     if enable_linreg:
-        try:
-            # 移除 NaN
-            mask = ~np.isnan(x_data) & ~np.isnan(y_data)
-            x_clean = x_data[mask]
-            y_clean = y_data[mask]
-            
-            if len(x_clean) > 1:
-                slope, intercept, r_value, p_value, std_err = stats.linregress(x_clean, y_clean)
-                
-                # 绘制回归线
-                line_x = np.array([x_clean.min(), x_clean.max()])
-                line_y = slope * line_x + intercept
-                
-                label_parts = []
-                if show_linreg_eq:
-                    if intercept >= 0: label_parts.append(rf"y={slope:.4f}x+{intercept:.4f}")
-                    else: label_parts.append(rf"y={slope:.4f}x{intercept:.4f}")
-                if show_linreg_r2:
-                    label_parts.append(rf"R^2={r_value**2:.4f}")
-                if show_linreg_p_value:
-                    label_parts.append(rf"p={p_value:.4f}")
-                if show_linreg_str_err:
-                    label_parts.append(rf"err={std_err:.4f}")
-                
-                label_text = "$linReg: " + ", ".join(label_parts) + "$"
+        _plot_linreg(ax, linreg_fit, label, line_width,
+                     show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err)
 
-                ax.plot(line_x, line_y, linestyle='--', linewidth=line_width, label=label_text)
-        except Exception as e:
-            st.warning(f"回归分析失败 ({label}): {e}")
+def _batch_linear_fits(df_plot, x_col, cols, data_version):
+    # 所有序列一次回归, 返回 {列名: 结果}; 整体失败时每列都记为该异常
+    cols = list(dict.fromkeys(cols))
+    try:
+        return dict(zip(cols, linear_fits(df_plot[x_col], [df_plot[col] for col in cols], data_version)))
+    except Exception as e:
+        return {col: e for col in cols}
+
+def _plot_linreg(ax, fit, label, line_width,
+                 show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err):
+    # fit 为 linear_fits 的结果: 字典 / None (有效点不足) / 异常对象
+    if isinstance(fit, Exception):
+        _warn(ax, f"回归分析失败 ({label}): {fit}")
+        return
+    if fit is None:
+        return
+    slope, intercept = fit['slope'], fit['intercept']
+    # 绘制回归线
+    line_x = np.array([fit['x_min'], fit['x_max']])
+    line_y = slope * line_x + intercept
+    
+    label_parts = []
+    if show_linreg_eq:
+        if intercept >= 0: label_parts.append(rf"y={slope:.4f}x+{intercept:.4f}")
+        else: label_parts.append(rf"y={slope:.4f}x{intercept:.4f}")
+    if show_linreg_r2:
+        label_parts.append(rf"R^2={fit['r2']:.4f}")
+    if show_linreg_p_value:
+        label_parts.append(rf"p={fit['p']:.4f}")
+    if show_linreg_str_err:
+        label_parts.append(rf"err={fit['std_err']:.4f}")
+    
+    label_text = "$linReg: " + ", ".join(label_parts) + "$"
+
+    ax.plot(line_x, line_y, linestyle='--', linewidth=line_width, label=label_text)
+
+def prepare_plot_data(plot_type, df_plot, x_col, y_cols,
+                      bins=20, hist_base=False,
+                      enable_interp=False, interp_kind='linear', interp_factor=5,
+                      enable_peaks=False, peak_prominence=0.1, peak_width=0.0,
+                      enable_linreg=False, extra_axes=None,
+                      enable_decimation=False, decimation_method='minmax', decimation_pixels=1000,
+                      enable_density=True, density_threshold=100_000,
+                      heatmap_order='original', heatmap_top_k=20,
+                      data_version=None, **style):
+    # 绘图前的数据准备: 插值、降采样、寻峰、回归、直方图计数、密度网格与相关性矩阵
+    # 不创建 Matplotlib 对象, 也不读取 rcParams, 可以在样式锁之外执行; style 为只在绘制阶段使用的参数
+    if extra_axes is None: extra_axes = []
+    extra_cols = [col for axis_config in extra_axes for col in axis_config.get('cols', [])]
+    prepared = {}
+
+    match plot_type:
+        case "Line Plot (折线图)":
+            series_cols = list(dict.fromkeys(list(y_cols) + extra_cols))
+            prepared['series'] = {
+                col: _prepare_series(df_plot[x_col], df_plot[col], col, enable_interp, interp_kind, interp_factor,
+                                     enable_decimation, decimation_method, decimation_pixels)
+                for col in series_cols
+            }
+            if enable_peaks:
+                # 所有序列 (含附加轴) 一起并行寻峰; 有数据版本时按 (版本, 列名) 缓存, 不对数据求哈希
+                digests = [(data_version, col) for col in series_cols] if data_version is not None else None
+                results = detect_peaks_batch([df_plot[col] for col in series_cols], peak_prominence, peak_width,
+                                             digests)
+                prepared['peaks'] = dict(zip(series_cols, results))
+            if enable_linreg:
+                # 所有序列一次完成回归
+                prepared['linreg'] = _batch_linear_fits(df_plot, x_col, series_cols, data_version)
+
+        case "Scatter Plot (散点图)":
+            # 密度网格的分辨率随图片像素宽度变化
+            density_bins = int(np.clip(decimation_pixels // 4, 64, 512))
+            prepared['density'] = {}
+            for col in dict.fromkeys(list(y_cols) + extra_cols):
+                if enable_density and len(df_plot) > density_threshold:
+                    try:
+                        prepared['density'][col] = density_counts(df_plot[x_col], df_plot[col], density_bins)
+                    except Exception as e:
+                        prepared['density'][col] = e
+            if enable_linreg:
+                prepared['linreg'] = _batch_linear_fits(df_plot, x_col, y_cols, data_version)
+
+        case "Histogram (直方图)":
+            series = df_plot[x_col]
+            if series.dtype.kind in 'iuf':
+                # 计数按数据版本缓存
+                prepared['histogram'] = histogram_counts(series, bins, data_version=data_version, use_base=hist_base)
+
+        case "Correlation Heatmap (相关性热力图)":
+            # 计算相关性矩阵 (分块 float32 计算, 按数据版本缓存)
+            columns, corr = correlation_matrix(df_plot, data_version)
+            order = order_columns(corr, heatmap_order, heatmap_top_k)
+            prepared['heatmap'] = ([columns[i] for i in order], corr[np.ix_(order, order)])
+
+    return prepared
 
 def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols, 
                       marker_style_val, line_style_val, line_width, marker_size, alpha, font_size,
-                      bins=20, 
+                      bins=20, hist_base=False,
                       enable_interp=False, interp_kind='linear', interp_factor=5,
                       enable_peaks=False, peak_prominence=0.1, peak_width=0.0,
                       enable_linreg=False, show_linreg_eq=True, show_linreg_r2=True, show_linreg_p_value=False, show_linreg_str_err=False,
-                      extra_axes=None):
+                      extra_axes=None,
+                      enable_decimation=False, decimation_method='minmax', decimation_pixels=1000,
+                      enable_density=True, density_threshold=100_000,
+                      heatmap_order='original', heatmap_top_k=20,
+                      heatmap_annot_threshold=0.0, heatmap_annot_budget=400,
+                      data_version=None, prepared=None):
+    # prepared 为 prepare_plot_data 的结果; 未提供时在此计算
     if extra_axes is None: extra_axes = []
+    if prepared is None:
+        prepared = prepare_plot_data(plot_type, df_plot, x_col, y_cols, bins, hist_base,
+                                     enable_interp, interp_kind, interp_factor,
+                                     enable_peaks, peak_prominence, peak_width,
+                                     enable_linreg, extra_axes,
+                                     enable_decimation, decimation_method, decimation_pixels,
+                                     enable_density, density_threshold,
+                                     heatmap_order, heatmap_top_k, data_version)
 
     match plot_type:
         case "Line Plot (折线图)":
+            peak_results = prepared.get('peaks', {})
+            linreg_fits = prepared.get('linreg', {})
+
             # Primary Axis
             for y_col in y_cols:
-                _plot_single_series(ax, df_plot[x_col], df_plot[y_col], y_col,
-                                  marker_style_val, line_style_val, line_width, marker_size, alpha,
-                                  enable_interp, interp_kind, interp_factor,
-                                  enable_peaks, peak_prominence, peak_width,
-                                  enable_linreg, show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err)
+                _plot_single_series(ax, df_plot[x_col], df_plot[y_col], y_col, prepared['series'][y_col],
+                                    marker_style_val, line_style_val, line_width, marker_size, alpha,
+                                    enable_peaks, enable_linreg,
+                                    show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err,
+                                    peak_results.get(y_col), linreg_fits.get(y_col))
             
             # Extra Axes
             extra_ax_objects = []
@@ -127,11 +291,11 @@ def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols,
                     new_ax.spines['left'].set_visible(True)
 
                 for y_col in cols:
-                    _plot_single_series(new_ax, df_plot[x_col], df_plot[y_col], y_col,
-                                      marker_style_val, line_style_val, line_width, marker_size, alpha,
-                                      enable_interp, interp_kind, interp_factor,
-                                      enable_peaks, peak_prominence, peak_width,
-                                      enable_linreg, show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err)
+                    _plot_single_series(new_ax, df_plot[x_col], df_plot[y_col], y_col, prepared['series'][y_col],
+                                        marker_style_val, line_style_val, line_width, marker_size, alpha,
+                                        enable_peaks, enable_linreg,
+                                        show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err,
+                                        peak_results.get(y_col), linreg_fits.get(y_col))
             
             # Collect handles for legend
             all_handles = []
@@ -146,38 +310,19 @@ def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols,
             ax.custom_labels = all_labels
 
         case "Scatter Plot (散点图)":
+            density_images = []
+            series_index = 0
+            linreg_fits = prepared.get('linreg', {})
             for y_col in y_cols:
-                ax.scatter(df_plot[x_col], df_plot[y_col], 
-                           marker=marker_style_val, s=marker_size, 
-                           label=y_col, alpha=alpha)
+                im = _plot_scatter_series(ax, df_plot[x_col], df_plot[y_col], y_col, series_index,
+                                          marker_style_val, marker_size, alpha, prepared['density'].get(y_col))
+                series_index += 1
+                if im is not None:
+                    density_images.append((im, y_col))
                 
                 if enable_linreg:
-                    try:
-                        x_data = df_plot[x_col]
-                        y_data = df_plot[y_col]
-                        mask = ~np.isnan(x_data) & ~np.isnan(y_data)
-                        x_clean = x_data[mask]
-                        y_clean = y_data[mask]
-                        if len(x_clean) > 1:
-                            slope, intercept, r_value, p_value, std_err = stats.linregress(x_clean, y_clean)
-                            line_x = np.array([x_clean.min(), x_clean.max()])
-                            line_y = slope * line_x + intercept
-                            
-                            label_parts = []
-                            if show_linreg_eq:
-                                if intercept >= 0: label_parts.append(rf"y={slope:.4f}x+{intercept:.4f}")
-                                else: label_parts.append(rf"y={slope:.4f}x{intercept:.4f}")
-                            if show_linreg_r2:
-                                label_parts.append(rf"R^2={r_value**2:.4f}")
-                            if show_linreg_p_value:
-                                label_parts.append(rf"p={p_value:.4f}")
-                            if show_linreg_str_err:
-                                label_parts.append(rf"err={std_err:.4f}")
-                            
-                            label_text = "$linReg: " + ", ".join(label_parts) + "$"
-                            ax.plot(line_x, line_y, linestyle='--', linewidth=line_width, label=label_text)
-                    except Exception as e:
-                        st.warning(f"回归分析失败 ({y_col}): {e}")
+                    _plot_linreg(ax, linreg_fits[y_col], y_col, line_width,
+                                 show_linreg_eq, show_linreg_r2, show_linreg_p_value, show_linreg_str_err)
             
             # Extra Axes for Scatter
             extra_ax_objects = []
@@ -200,9 +345,17 @@ def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols,
                     new_ax.spines['left'].set_visible(True)
 
                 for y_col in cols:
-                    new_ax.scatter(df_plot[x_col], df_plot[y_col], 
-                                   marker=marker_style_val, s=marker_size, 
-                                   label=y_col, alpha=alpha)
+                    im = _plot_scatter_series(new_ax, df_plot[x_col], df_plot[y_col], y_col, series_index,
+                                              marker_style_val, marker_size, alpha, prepared['density'].get(y_col))
+                    series_index += 1
+                    if im is not None:
+                        density_images.append((im, y_col))
+
+            # 为第一个密度图添加色条 (在所有坐标轴创建之后, 使双Y轴一同收缩)
+            if density_images:
+                im, y_col = density_images[0]
+                colorbar = ax.figure.colorbar(im, ax=[ax] + extra_ax_objects, pad=0.1 if extra_ax_objects else 0.03)
+                colorbar.set_label(f"{y_col} 点数")
 
             # Collect handles
             all_handles = []
@@ -227,7 +380,13 @@ def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols,
             ax.set_xticklabels(df_plot[x_col], rotation=45)
         
         case "Histogram (直方图)":
-            ax.hist(df_plot[x_col], bins=bins, alpha=alpha, color='#0078d4', edgecolor='black')
+            series = df_plot[x_col]
+            if series.dtype.kind in 'iuf':
+                # 只绘制一个阶梯图对象
+                counts, edges = prepared['histogram']
+                ax.stairs(counts, edges, fill=True, alpha=alpha, facecolor='#0078d4', edgecolor='black')
+            else:
+                ax.hist(series, bins=bins, alpha=alpha, color='#0078d4', edgecolor='black')
 
         case "Box Plot (箱线图)":
             data_to_plot = [df_plot[col].dropna() for col in y_cols]
@@ -256,19 +415,25 @@ def draw_plot_content(ax, plot_type, df_plot, x_col, y_cols,
             ax.set_xticklabels(y_cols)
 
         case "Correlation Heatmap (相关性热力图)":
-            # 计算相关性矩阵
-            corr = df_plot.select_dtypes(include=[np.number]).corr()
-            im = ax.imshow(corr, cmap='coolwarm', interpolation='nearest')
-            plt.colorbar(im, ax=ax)
-            # 添加标签
-            tick_marks = np.arange(len(corr.columns))
+            labels, corr = prepared['heatmap']
+            n_cols = len(labels)
+            im = ax.imshow(corr, cmap='coolwarm', vmin=-1, vmax=1, interpolation='nearest')
+            ax.figure.colorbar(im, ax=ax)
+            # 添加标签, 刻度间隔与标注预算由坐标轴的像素尺寸和字号决定, 标签不会重叠
+            step, annot_budget = heatmap_layout(ax, n_cols, font_size, heatmap_annot_budget)
+            tick_marks = np.arange(0, n_cols, step)
             ax.set_xticks(tick_marks)
             ax.set_yticks(tick_marks)
-            ax.set_xticklabels(corr.columns, rotation=45)
-            ax.set_yticklabels(corr.columns)
-            # 在格子上显示数值
-            for i in range(len(corr.columns)):
-                for j in range(len(corr.columns)):
-                    text = ax.text(j, i, f"{corr.iloc[i, j]:.2f}",
-                                   ha="center", va="center", color="black", fontsize=font_size-2)
+            ax.set_xticklabels([labels[i] for i in tick_marks], rotation=45)
+            ax.set_yticklabels([labels[i] for i in tick_marks])
+            # 在格子上显示数值, 只标注 |r| 不低于阈值的格子, 数量不超过预算
+            mask = annotation_mask(corr, annot_budget, heatmap_annot_threshold)
+            for i, j in zip(*np.nonzero(mask)):
+                ax.text(j, i, f"{corr[i, j]:.2f}",
+                        ha="center", va="center", color="black", fontsize=font_size-2)
+            hidden = n_cols * n_cols - int(mask.sum())
+            if hidden and annot_budget == 0 and heatmap_annot_budget > 0:
+                _note(ax, f"热力图共 {n_cols}×{n_cols} 格, 格子小于数值文字, 未标注数值 (可增大图片尺寸或减小字号)")
+            elif hidden:
+                _note(ax, f"热力图共 {n_cols}×{n_cols} 格, 已标注 {int(mask.sum())} 格, 其余 {hidden} 格未标注数值")
         
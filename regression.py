@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from scipy import special
+
+from cache import LRUCache, array_digest
+
+# 回归结果缓存: (x 哈希, y 哈希) -> 结果字典
+_fit_cache = LRUCache(max_entries=1024)
+
+_TINY = 1.0e-20
+
+
+def _sums(x, ys):
+    # 每列的 (有效点数, x 均值, y 均值, Σdx², Σdy², Σdxdy), 先减均值再求平方和, 避免大数相减的精度损失
+    # 无缺失值的列组成矩阵一次计算, 含缺失值的列逐列剔除 x 或 y 为 NaN 的行
+    k = len(ys)
+    n = np.zeros(k, dtype=np.int64)
+    x_mean, y_mean, ssxm, ssym, ssxym, x_min, x_max = (np.full(k, np.nan) for _ in range(7))
+    x_valid = ~np.isnan(x)
+    x_complete = x_valid.all()
+    clean = []
+    for j, y in enumerate(ys):
+        if x_complete and not np.isnan(y).any():
+            clean.append(j)
+            continue
+        mask = x_valid & ~np.isnan(y)
+        xv, yv = x[mask], y[mask]
+        n[j] = len(xv)
+        if n[j]:
+            x_mean[j], y_mean[j] = xv.mean(), yv.mean()
+            dx, dy = xv - x_mean[j], yv - y_mean[j]
+            ssxm[j], ssym[j], ssxym[j] = dx @ dx, dy @ dy, dx @ dy
+            x_min[j], x_max[j] = xv.min(), xv.max()
+    if clean and len(x):
+        dx = x - x.mean()
+        # 每列一行, 按行连续存放
+        block = np.vstack([ys[j] for j in clean])
+        means = block.mean(axis=1)
+        block -= means[:, None]
+        n[clean] = len(x)
+        x_mean[clean] = x.mean()
+        y_mean[clean] = means
+        ssxm[clean] = dx @ dx
+        ssym[clean] = np.einsum('ij,ij->i', block, block)
+        ssxym[clean] = block @ dx
+        x_min[clean], x_max[clean] = x.min(), x.max()
+    return n, x_mean, y_mean, ssxm, ssym, ssxym, x_min, x_max
+
+
+def _fit_columns(x, ys):
+    # 闭式解一次性计算多列对同一 x 的一元线性回归, 与 scipy.stats.linregress 的结果一致
+    x = np.asarray(x, dtype=float)
+    ys = [np.asarray(y, dtype=float) for y in ys]
+    n, x_mean, y_mean, ssxm, ssym, ssxym, x_min, x_max = _sums(x, ys)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = np.where((ssxm == 0) | (ssym == 0), 0.0, ssxym / np.sqrt(ssxm * ssym))
+        r = np.clip(r, -1.0, 1.0)
+        slope = ssxym / ssxm
+        intercept = y_mean - slope * x_mean
+        dof = n - 2
+        t = r * np.sqrt(dof / ((1.0 - r + _TINY) * (1.0 + r + _TINY)))
+        p_value = 2 * special.stdtr(dof, -np.abs(t))
+        std_err = np.sqrt((1 - r ** 2) * ssym / ssxm / dof)
+
+    results = []
+    for j in range(len(ys)):
+        if n[j] < 2:
+            results.append(None)
+            continue
+        if ssxm[j] == 0:
+            results.append(ValueError("x 值全部相同, 无法进行线性回归"))
+            continue
+        fit = {
+            'n': int(n[j]), 'slope': slope[j], 'intercept': intercept[j],
+            'r': r[j], 'r2': r[j] ** 2, 'p': p_value[j], 'std_err': std_err[j],
+            'x_min': x_min[j], 'x_max': x_max[j]
+        }
+        if n[j] == 2:
+            # 只有两个点时与 linregress 一致: 直线必然经过两点
+            y_valid = ys[j][~np.isnan(x) & ~np.isnan(ys[j])]
+            fit['p'] = 1.0 if y_valid[0] == y_valid[1] else 0.0
+            fit['std_err'] = 0.0
+        results.append(fit)
+    return results
+
+
+def linear_fits(x_data, y_list, data_version=None):
+    # 返回与 y_list 等长的列表, 每项为结果字典; 有效点少于 2 个时为 None, 无法回归时为异常对象
+    # 有数据版本时按 (数据版本, x 列名, y 列名) 缓存, 否则按数据内容缓存; 只计算未命中的列
+    if data_version is not None:
+        keys = [(data_version, x_data.name, y.name) for y in y_list]
+    else:
+        x_key = array_digest(np.asarray(x_data))
+        keys = [(x_key, array_digest(np.asarray(y))) for y in y_list]
+    results = [_fit_cache.get(key) for key in keys]
+    missing = [i for i, entry in enumerate(results) if entry is None]
+    if missing:
+        computed = _fit_columns(x_data, [y_list[i] for i in missing])
+        for i, entry in zip(missing, computed):
+            if entry is not None:
+                _fit_cache.put(keys[i], entry)
+            results[i] = entry
+    return results
+
+
+def regression_table(df, x_col, y_cols, data_version=None):
+    # 所有选中列的回归结果表
+    rows = []
+    for col, fit in zip(y_cols, linear_fits(df[x_col], [df[c] for c in y_cols], data_version)):
+        if isinstance(fit, dict):
+            rows.append({'series': col, **{k: fit[k] for k in ('n', 'slope', 'intercept', 'r2', 'p', 'std_err')}})
+    return pd.DataFrame(rows, columns=['series', 'n', 'slope', 'intercept', 'r2', 'p', 'std_err'])
@@ -0,0 +1,397 @@
+import itertools
+import multiprocessing as mp
+import os
+import pickle
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from multiprocessing import connection, shared_memory
+
+import numpy as np
+import pandas as pd
+
+# 工作进程数量, 可通过环境变量配置
+DEFAULT_POOL_SIZE = int(os.environ.get('PLT_WEBUI_RENDER_WORKERS', '2'))
+# 单个渲染任务的默认超时 (秒)
+DEFAULT_TIMEOUT = 60.0
+# 共享内存中最多同时保留的数据版本数
+MAX_SHARED_FRAMES = 4
+# 工作进程中最多保留的已映射数据数
+_WORKER_FRAME_CACHE = 4
+_ALIGN = 64
+# 等待结果时回调 on_wait 的间隔 (秒)
+_POLL_INTERVAL = 0.1
+
+
+def share_frame(df):
+    # 将 DataFrame 写入一块共享内存: 数值列按 64 字节对齐依次存放, 其余列整体 pickle 后附在末尾
+    # 返回 (SharedMemory, layout), layout 只包含偏移与类型信息, 随任务发送给工作进程
+    columns = []
+    arrays = []
+    pickled = {}
+    offset = 0
+    for col in df.columns:
+        series = df[col]
+        if isinstance(series.dtype, np.dtype) and series.dtype.kind in 'biufcmM':
+            values = np.ascontiguousarray(series.to_numpy())
+            offset = -(-offset // _ALIGN) * _ALIGN
+            columns.append({'name': col, 'kind': 'array', 'dtype': values.dtype.str, 'offset': offset})
+            arrays.append((offset, values))
+            offset += values.nbytes
+        else:
+            columns.append({'name': col, 'kind': 'pickled'})
+            pickled[col] = series
+
+    payload = pickle.dumps(pickled, protocol=pickle.HIGHEST_PROTOCOL) if pickled else b''
+    pickled_offset = offset
+    shm = shared_memory.SharedMemory(create=True, size=max(offset + len(payload), 1))
+    for start, values in arrays:
+        np.ndarray(values.shape, dtype=values.dtype, buffer=shm.buf, offset=start)[...] = values
+    shm.buf[pickled_offset:pickled_offset + len(payload)] = payload
+
+    layout = {
+        'name': shm.name,
+        'rows': len(df),
+        'columns': columns,
+        'pickled': (pickled_offset, len(payload))
+    }
+    return shm, layout
+
+
+def _unlink(shm):
+    # 关闭并删除父进程创建的共享内存
+    shm.close()
+    shm.unlink()
+
+
+def _attach_shared_memory(name):
+    # spawn 出的工作进程与父进程共用同一个 resource_tracker, 共享内存的生命周期 (unlink) 由父进程负责
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+def _frame_from_layout(shm, layout):
+    pickled = {}
+    start, length = layout['pickled']
+    if length:
+        pickled = pickle.loads(shm.buf[start:start + length])
+
+    columns = {}
+    for entry in layout['columns']:
+        if entry['kind'] == 'array':
+            columns[entry['name']] = np.ndarray((layout['rows'],), dtype=np.dtype(entry['dtype']),
+                                                buffer=shm.buf, offset=entry['offset'])
+        else:
+            columns[entry['name']] = pickled[entry['name']].reset_index(drop=True)
+    if not columns:
+        return pd.DataFrame(index=pd.RangeIndex(layout['rows']))
+    return pd.DataFrame(columns, copy=False)
+
+
+def _worker_main(conn):
+    # 工作进程: 按名称映射共享内存中的数据 (零拷贝), 调用与进程内相同的 render_plot
+    from renderer import render_plot
+
+    frames = {}
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message is None:
+            break
+        job_id, layout, data_version, params, format, dpi = message
+        try:
+            if layout['name'] not in frames:
+                while len(frames) >= _WORKER_FRAME_CACHE:
+                    old_shm, _ = frames.pop(next(iter(frames)))
+                    try:
+                        old_shm.close()
+                    except BufferError:
+                        pass
+                shm = _attach_shared_memory(layout['name'])
+                frames[layout['name']] = (shm, _frame_from_layout(shm, layout))
+            result = render_plot(frames[layout['name']][1], params, data_version, format, dpi)
+            conn.send((job_id, result, None))
+        except Exception as e:
+            conn.send((job_id, None, str(e)))
+
+
+class RenderJob:
+    def __init__(self, job_id, slot, data_version, layout, params, timeout, format='png', dpi=None):
+        self.job_id = job_id
+        self.slot = slot
+        self.data_version = data_version
+        self.layout = layout
+        self.params = params
+        self.format = format
+        self.dpi = dpi
+        self.timeout = timeout
+        self.future = Future()
+        self.deadline = None
+        self.worker = None
+
+    def done(self):
+        return self.future.done()
+
+    def result(self, timeout=None):
+        return self.future.result(timeout=timeout)
+
+
+class _Worker:
+    def __init__(self, ctx):
+        self.conn, child_conn = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child_conn,), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.job = None
+
+    def stop(self, force=False):
+        if force:
+            self.process.terminate()
+        else:
+            try:
+                self.conn.send(None)
+            except (OSError, BrokenPipeError):
+                self.process.terminate()
+        self.process.join(timeout=5)
+        self.conn.close()
+
+
+class RenderPool:
+    # 进程池渲染后端: 数据通过共享内存传递, 每个任务有独立超时
+    # 同一 slot (通常是一个会话) 提交新任务时, 旧任务被取消; 已在运行的旧任务通过结束其工作进程来中止
+    def __init__(self, size=DEFAULT_POOL_SIZE):
+        self.size = max(1, size)
+        self._ctx = mp.get_context('spawn')
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers = [_Worker(self._ctx) for _ in range(self.size)]
+        self._pending = deque()
+        self._slots = {}
+        self._shared = {}
+        self._job_ids = itertools.count()
+        self._counters = {'submitted': 0, 'completed': 0, 'cancelled': 0, 'timed_out': 0, 'failed': 0}
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch_loop, name='render-pool', daemon=True)
+        self._dispatcher.start()
+
+    # --- 共享数据 ---
+
+    def _acquire_shared(self, data_version, copy=None):
+        # 同一数据版本只写入一次共享内存, 以引用计数保护正在被任务使用的数据
+        # copy 为锁外 share_frame 得到的 (SharedMemory, layout); 该版本尚未共享且没有 copy 时返回 None
+        # 其他线程已先发布同一版本时, 多余的 copy 被释放
+        entry = self._shared.get(data_version)
+        if entry is None:
+            if copy is None:
+                return None
+            shm, layout = copy
+            entry = {'shm': shm, 'layout': layout, 'refs': 0}
+            self._shared[data_version] = entry
+        elif copy is not None:
+            _unlink(copy[0])
+        entry['refs'] += 1
+        entry['last_used'] = time.monotonic()
+        self._evict_shared()
+        return entry['layout']
+
+    def _release_shared(self, data_version):
+        entry = self._shared.get(data_version)
+        if entry is not None:
+            entry['refs'] -= 1
+
+    def _evict_shared(self):
+        idle = sorted((e['last_used'], v) for v, e in self._shared.items() if e['refs'] == 0)
+        while len(self._shared) > MAX_SHARED_FRAMES and idle:
+            _, version = idle.pop(0)
+            _unlink(self._shared.pop(version)['shm'])
+
+    # --- 任务管理 ---
+
+    def submit(self, slot, df, data_version, params, timeout=DEFAULT_TIMEOUT, format='png', dpi=None):
+        copy = None
+        while True:
+            with self._lock:
+                if self._closed:
+                    if copy is not None:
+                        _unlink(copy[0])
+                    raise RuntimeError("渲染进程池已关闭")
+                layout = self._acquire_shared(data_version, copy)
+                if layout is not None:
+                    previous = self._slots.get(slot)
+                    if previous is not None and not previous.done():
+                        self._cancel_locked(previous)
+                    job = RenderJob(next(self._job_ids), slot, data_version, layout, params, timeout, format, dpi)
+                    self._slots[slot] = job
+                    self._pending.append(job)
+                    self._counters['submitted'] += 1
+                    break
+            # 该数据版本尚未共享: 在锁外复制到共享内存, 复制期间其他会话的提交与任务调度不被阻塞
+            copy = share_frame(df)
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job):
+        with self._lock:
+            self._cancel_locked(job)
+
+    def _cancel_locked(self, job):
+        if job.done():
+            return
+        if job.worker is None:
+            # 尚未开始: 从队列中移除即可
+            job.future.cancel()
+            if job in self._pending:
+                self._pending.remove(job)
+        else:
+            self._restart_worker(job.worker)
+            job.future.set_exception(CancelledError())
+        self._counters['cancelled'] += 1
+        self._finish_locked(job)
+
+    def _finish_locked(self, job):
+        self._release_shared(job.data_version)
+        if self._slots.get(job.slot) is job:
+            del self._slots[job.slot]
+        if job.worker is not None:
+            job.worker.job = None
+            job.worker = None
+
+    def _restart_worker(self, worker):
+        index = self._workers.index(worker)
+        worker.stop(force=True)
+        self._workers[index] = _Worker(self._ctx)
+
+    def render(self, slot, df, data_version, params, timeout=DEFAULT_TIMEOUT, on_wait=None, format='png', dpi=None):
+        # 提交并等待结果; 等待期间周期性调用 on_wait(已用秒数)
+        # on_wait 抛出的异常 (例如 Streamlit 因参数变化而中止本次运行) 会取消该任务
+        job = self.submit(slot, df, data_version, params, timeout=timeout, format=format, dpi=dpi)
+        started = time.monotonic()
+        try:
+            while True:
+                try:
+                    return job.result(timeout=_POLL_INTERVAL)
+                except FutureTimeoutError:
+                    if on_wait is not None:
+                        on_wait(time.monotonic() - started)
+        finally:
+            if not job.done():
+                self.cancel(job)
+
+    # --- 调度 ---
+
+    def _dispatch_loop(self):
+        while not self._closed:
+            with self._lock:
+                self._assign_pending_locked()
+                self._check_deadlines_locked()
+                busy = {w.conn: w for w in self._workers if w.job is not None}
+            if not busy:
+                self._wakeup.wait(_POLL_INTERVAL)
+                self._wakeup.clear()
+                continue
+            try:
+                ready = connection.wait(list(busy), timeout=_POLL_INTERVAL)
+            except (OSError, ValueError):
+                # 等待期间工作进程被其他线程重启, 连接已关闭
+                continue
+            for conn in ready:
+                self._receive(busy[conn])
+
+    def _assign_pending_locked(self):
+        for worker in self._workers:
+            if worker.job is not None:
+                continue
+            while self._pending:
+                job = self._pending.popleft()
+                if not job.future.set_running_or_notify_cancel():
+                    continue
+                try:
+                    worker.conn.send((job.job_id, job.layout, job.data_version, job.params, job.format, job.dpi))
+                except (OSError, BrokenPipeError):
+                    self._restart_worker(worker)
+                    self._pending.appendleft(job)
+                    break
+                job.worker = worker
+                job.deadline = time.monotonic() + job.timeout if job.timeout else None
+                worker.job = job
+                break
+
+    def _check_deadlines_locked(self):
+        now = time.monotonic()
+        for worker in list(self._workers):
+            job = worker.job
+            if job is not None and job.deadline is not None and now > job.deadline:
+                self._restart_worker(worker)
+                job.future.set_exception(TimeoutError(f"渲染超时 (>{job.timeout:g}s)"))
+                self._counters['timed_out'] += 1
+                self._finish_locked(job)
+
+    def _receive(self, worker):
+        with self._lock:
+            job = worker.job
+            if job is None:
+                return
+            try:
+                job_id, result, error = worker.conn.recv()
+            except (EOFError, OSError):
+                self._restart_worker(worker)
+                job.future.set_exception(RuntimeError("渲染进程异常退出"))
+                self._counters['failed'] += 1
+                self._finish_locked(job)
+                return
+            if job_id != job.job_id:
+                return
+            if error is None:
+                job.future.set_result(result)
+                self._counters['completed'] += 1
+            else:
+                job.future.set_exception(RuntimeError(error))
+                self._counters['failed'] += 1
+            self._finish_locked(job)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._counters)
+            stats.update({
+                'workers': self.size,
+                'busy': sum(1 for w in self._workers if w.job is not None),
+                'pending': len(self._pending),
+                'shared_frames': len(self._shared)
+            })
+            return stats
+
+    def shutdown(self):
+        with self._lock:
+            self._closed = True
+            for job in self._pending:
+                job.future.cancel()
+            self._pending.clear()
+            for worker in self._workers:
+                if worker.job is not None:
+                    worker.job.future.set_exception(CancelledError())
+                    worker.stop(force=True)
+                else:
+                    worker.stop()
+            for entry in self._shared.values():
+                _unlink(entry['shm'])
+            self._shared.clear()
+        self._wakeup.set()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_render_pool(size=None):
+    # 进程级单例, 首次使用时才启动工作进程
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = RenderPool(size or DEFAULT_POOL_SIZE)
+        return _pool
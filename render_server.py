@@ -0,0 +1,177 @@
+import argparse
+import json
+import re
+import threading
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from cache import LRUCache
+from dataset_store import has_dataset, list_datasets, open_dataset, read_dataset_meta
+from plot_spec import PlotSpec
+from render_pool import get_render_pool
+from renderer import cached_render, render_cache_stats
+
+# 无界面的渲染服务: 用 JSON 描述的 PlotSpec 渲染数据仓库中已导入的数据集, 不经过 Streamlit
+#   GET  /health               服务状态与缓存统计
+#   GET  /datasets             已导入的数据集 id 与列名
+#   POST /render               请求体 {"dataset_id": ..., "spec": {...}, "format": "png" | "svg"}
+#   GET  /render?dataset_id=...&spec=<JSON>&format=png
+# 成功时返回图片, 渲染信息 (警告、降采样记录) 以 JSON 放在响应头 X-Render-Info 中
+# 失败时返回 {"error": ...}: 参数错误 400, 数据集不存在 404, 渲染失败 500
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1 * 2**20
+
+FORMATS = {'png': 'image/png', 'svg': 'image/svg+xml'}
+_DATASET_ID = re.compile(r'[0-9a-f]{32}')
+
+# 已打开的数据集 (内存映射, 打开代价很低, 但仍避免每个请求都重新读取元数据)
+_frames = LRUCache(max_entries=8)
+_frames_lock = threading.Lock()
+
+
+class RequestError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _dataset_frame(dataset_id):
+    with _frames_lock:
+        df = _frames.get(dataset_id)
+        if df is None:
+            if not isinstance(dataset_id, str) or not _DATASET_ID.fullmatch(dataset_id) or not has_dataset(dataset_id):
+                raise RequestError(404, f"数据集不存在: {dataset_id}")
+            df = open_dataset(dataset_id)
+            _frames.put(dataset_id, df)
+        return df
+
+
+def handle_render(request, pool=None, timeout=None):
+    # request: {"dataset_id", "spec", "format"} -> (图片字节, content-type, 渲染信息)
+    if not isinstance(request, dict):
+        raise RequestError(400, "请求体必须是 JSON 对象")
+    format = request.get('format', 'png')
+    if format not in FORMATS:
+        raise RequestError(400, f"不支持的格式: {format}")
+    try:
+        spec = PlotSpec.from_dict(request.get('spec') or {})
+    except (TypeError, ValueError) as e:
+        raise RequestError(400, str(e))
+    dataset_id = request.get('dataset_id')
+    df = _dataset_frame(dataset_id)
+
+    missing = [col for col in [spec.x_col, *spec.y_cols] if col is not None and col not in df.columns]
+    if missing:
+        raise RequestError(400, f"数据集中没有这些列: {', '.join(map(str, missing))}")
+
+    # 数据集 id 由文件内容决定, 直接作为渲染缓存键中的数据版本
+    if pool is None:
+        image, info = cached_render(df, dataset_id, spec, format=format)
+    else:
+        image, info = cached_render(df, dataset_id, spec, pool=pool, slot=uuid.uuid4().hex,
+                                    timeout=timeout, format=format)
+    return image, FORMATS[format], info
+
+
+class RenderHandler(BaseHTTPRequestHandler):
+    server_version = 'simple-plt-render/1.0'
+    pool = None
+    timeout = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _render(self, request):
+        try:
+            image, content_type, info = handle_render(request, self.pool, self.timeout)
+        except RequestError as e:
+            self._send_json(e.status, {'error': str(e)})
+            return
+        except Exception as e:
+            self._send_json(500, {'error': str(e)})
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(image)))
+        # 响应头只能是 ASCII, 中文以 \u 转义
+        self.send_header('X-Render-Info', json.dumps(info, ensure_ascii=True, default=str))
+        self.end_headers()
+        self.wfile.write(image)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            payload = {'status': 'ok', 'render_cache': render_cache_stats()}
+            if self.pool is not None:
+                payload['render_pool'] = self.pool.stats()
+            self._send_json(200, payload)
+        elif url.path == '/datasets':
+            datasets = []
+            for dataset_id in list_datasets():
+                meta = read_dataset_meta(dataset_id)
+                datasets.append({'dataset_id': dataset_id, 'rows': meta.get('rows'),
+                                 'columns': [c['name'] for c in meta.get('columns', [])]})
+            self._send_json(200, {'datasets': datasets})
+        elif url.path == '/render':
+            query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+            try:
+                query['spec'] = json.loads(query.get('spec', '{}'))
+            except json.JSONDecodeError as e:
+                self._send_json(400, {'error': f"spec 不是有效的 JSON: {e}"})
+                return
+            self._render(query)
+        else:
+            self._send_json(404, {'error': f"未知路径: {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != '/render':
+            self._send_json(404, {'error': f"未知路径: {self.path}"})
+            return
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY_BYTES:
+            self._send_json(413, {'error': "请求体过大"})
+            return
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            self._send_json(400, {'error': f"请求体不是有效的 JSON: {e}"})
+            return
+        self._render(request)
+
+
+def make_server(host=DEFAULT_HOST, port=DEFAULT_PORT, pool=None, timeout=None):
+    handler = type('Handler', (RenderHandler,), {'pool': pool, 'timeout': timeout})
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="simple-plt-webui 渲染服务")
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--pool', action='store_true', help="在后台进程池中渲染 (进程数由 PLT_WEBUI_RENDER_WORKERS 设置)")
+    parser.add_argument('--timeout', type=float, default=None, help="使用进程池时单次渲染的超时 (秒)")
+    args = parser.parse_args(argv)
+
+    pool = get_render_pool() if args.pool else None
+    server = make_server(args.host, args.port, pool, args.timeout)
+    print(f"渲染服务已启动: http://{args.host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if pool is not None:
+            pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,221 @@
+import hashlib
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+import matplotlib as mpl
+import matplotlib.style
+import numpy as np
+
+from cache import LRUCache
+from figures import figure_to_bytes, managed_figure, rasterize_dense_artists
+from plot_spec import PlotSpec
+from plot_type import draw_plot_content, prepare_plot_data
+
+# 渲染结果缓存的字节预算 (按图片大小计)
+RENDER_CACHE_BYTES = 128 * 2**20
+# 页面预览的分辨率: 与屏幕相当, 不随导出 DPI 增大
+PREVIEW_DPI = 100
+# 矢量格式中点数超过该值的图层以位图嵌入
+RASTERIZE_POINTS = 20_000
+VECTOR_FORMATS = ('svg', 'pdf')
+
+# 渐进式渲染: 数据行数超过 PROGRESSIVE_ROWS 时先显示草图, 完整图片渲染完成后替换
+PROGRESSIVE_ROWS = 100_000
+# 草图按 DRAFT_DPI 渲染等间隔抽取的行, 抽样行数从 DRAFT_ROWS 开始, 在 [DRAFT_MIN_ROWS, DRAFT_MAX_ROWS] 内
+# 按实际耗时自动调整, 使草图的渲染时间保持在 DRAFT_BUDGET 秒左右
+DRAFT_DPI = 40
+DRAFT_BUDGET = 0.1
+DRAFT_ROWS = 5_000
+DRAFT_MIN_ROWS = 1_000
+DRAFT_MAX_ROWS = 20_000
+# 柱状图与饼图每行绘制一个柱子/扇形, 草图另设上限
+PER_ROW_PLOT_TYPES = ["Bar Chart (柱状图)", "Pie Chart (饼图)"]
+DRAFT_PER_ROW_ROWS = 30
+
+# 渲染结果缓存: 渲染键 -> (图片字节, 渲染信息), 进程内所有会话共享
+_render_cache = LRUCache(max_entries=None, max_bytes=RENDER_CACHE_BYTES, sizeof=lambda entry: len(entry[0]))
+
+# Matplotlib 的 rcParams 是进程级全局状态, rc_context 只是在退出时恢复
+# 因此仅在读取样式的绘制/保存阶段串行化; 数据准备 (prepare_plot_data) 在锁外进行
+_rc_lock = threading.RLock()
+
+# 各图表类型当前的草图抽样行数
+_draft_rows = {}
+
+
+@contextmanager
+def scoped_style(theme_style, rc, custom_rc=None, warnings=None):
+    # 每次渲染都从默认参数出发应用样式, 退出后恢复, 不同会话的样式/DPI 不会互相影响
+    with _rc_lock, mpl.rc_context():
+        mpl.rcdefaults()
+        mpl.style.use(theme_style)
+        mpl.rcParams.update(rc)
+        if custom_rc:
+            try:
+                mpl.rcParams.update(json.loads(custom_rc))
+            except Exception as e:
+                if warnings is not None:
+                    warnings.append(f"自定义 rcParams 解析失败: {e}")
+        yield
+
+
+def _as_spec(params):
+    return params if isinstance(params, PlotSpec) else PlotSpec.from_dict(params)
+
+
+def render_key(data_version, params, format='png', dpi=None):
+    # 参数均为基本类型, 排序后序列化得到稳定的哈希
+    if isinstance(params, PlotSpec):
+        params = params.to_dict()
+    payload = json.dumps([data_version, params, format, dpi], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def _parse_limit(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def render_plot(df_plot, params, data_version=None, format='png', dpi=None, tight=True):
+    # 按参数 (PlotSpec 或等价的字典) 绘制完整图表并返回 (图片字节, 渲染信息), format 为 'png'、'svg' 或 'pdf'
+    # dpi 为空时使用参数中的 DPI (导出); 页面预览传入 PREVIEW_DPI, 不必按打印分辨率栅格化
+    # tight=False 时不裁剪空白边距, 省去保存时额外的一次布局计算 (用于草图)
+    # 渲染信息包含警告列表 'warnings'、提示列表 'notes' 与降采样记录 'decimation' [(序列, 原始点数, 绘制点数)]
+    # data_version 用作相关性矩阵等中间结果的缓存键
+    spec = _as_spec(params)
+    dpi = spec.dpi if dpi is None else dpi
+    warnings = []
+    # 插值、寻峰、回归、降采样等计算不依赖样式, 在获取样式锁之前完成, 其他会话的渲染不必等待
+    draw_kwargs = dict(spec.draw_kwargs(), decimation_pixels=int(spec.fig_width * dpi), data_version=data_version)
+    prepared = prepare_plot_data(spec.plot_type, df_plot, spec.x_col, spec.y_cols, **draw_kwargs)
+    rc = {
+        'font.sans-serif': [spec.font_family, 'Microsoft YaHei', 'SimHei', 'Arial', 'sans-serif'],
+        'axes.unicode_minus': False,
+        'font.size': spec.font_size,
+        'figure.dpi': dpi,
+        # 未降采样的长折线 (x 不单调时) 与矢量格式中栅格化的图层分块交给 Agg, 避免超出单条路径的上限
+        'agg.path.chunksize': 10_000
+    }
+
+    with scoped_style(spec.theme_style, rc, spec.custom_rc, warnings), \
+            managed_figure(figsize=(spec.fig_width, spec.fig_height), dpi=dpi) as (fig, ax):
+        plot_type = spec.plot_type
+        y_cols = spec.y_cols
+        font_size = spec.font_size
+
+        # 降采样的目标点数由绘图区的像素宽度决定
+        draw_plot_content(ax, plot_type, df_plot, spec.x_col, y_cols, prepared=prepared, **draw_kwargs)
+
+        # 坐标轴设置
+        if spec.log_x: ax.set_xscale('log')
+        if spec.log_y: ax.set_yscale('log')
+        if spec.invert_x: ax.invert_xaxis()
+        if spec.invert_y: ax.invert_yaxis()
+
+        # 坐标轴范围手动设置
+        x_min, x_max = _parse_limit(spec.x_min), _parse_limit(spec.x_max)
+        y_min, y_max = _parse_limit(spec.y_min), _parse_limit(spec.y_max)
+        if x_min is not None: ax.set_xlim(left=x_min)
+        if x_max is not None: ax.set_xlim(right=x_max)
+        if y_min is not None: ax.set_ylim(bottom=y_min)
+        if y_max is not None: ax.set_ylim(top=y_max)
+
+        # 通用设置
+        ax.set_title(spec.plot_title, fontsize=font_size+2, pad=15)
+        if plot_type not in ["Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"]:
+            if spec.x_label: ax.set_xlabel(spec.x_label, fontsize=font_size)
+            if spec.y_label: ax.set_ylabel(spec.y_label, fontsize=font_size)
+
+        if spec.show_grid and plot_type not in ["Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"]:
+            ax.grid(True, linestyle='--', alpha=0.7)
+
+        if plot_type not in ["Histogram (直方图)", "Pie Chart (饼图)", "Correlation Heatmap (相关性热力图)"] and len(y_cols) > 0 and spec.show_legend:
+            if hasattr(ax, 'custom_handles') and ax.custom_handles:
+                ax.legend(handles=ax.custom_handles, labels=ax.custom_labels, loc=spec.legend_loc)
+            else:
+                ax.legend(loc=spec.legend_loc)
+
+        notes = list(getattr(fig, 'render_notes', []))
+        if format in VECTOR_FORMATS:
+            rasterized = rasterize_dense_artists(fig, RASTERIZE_POINTS)
+            if rasterized:
+                notes.append(f"{rasterized} 个数据点较多的图层以 {dpi} DPI 位图嵌入")
+        image_bytes = figure_to_bytes(fig, format=format, dpi=dpi, bbox_inches='tight' if tight else None)
+        warnings.extend(getattr(fig, 'render_warnings', []))
+        info = {
+            'warnings': warnings,
+            'notes': notes,
+            'decimation': getattr(fig, 'decimation_info', [])
+        }
+    return image_bytes, info
+
+
+def cached_render(df_plot, data_version, params, pool=None, slot=None, timeout=None, on_wait=None, format='png', dpi=None):
+    # 命中时直接返回缓存的图片, 不调用 draw_plot_content
+    # 指定 pool 时在工作进程中渲染, slot 相同的旧任务会被取消
+    if isinstance(params, PlotSpec):
+        params = params.to_dict()
+    key = render_key(data_version, params, format, dpi)
+    entry = _render_cache.get(key)
+    if entry is None:
+        if pool is None:
+            entry = render_plot(df_plot, params, data_version, format, dpi)
+        else:
+            entry = pool.render(slot, df_plot, data_version, params, timeout=timeout, on_wait=on_wait, format=format, dpi=dpi)
+        _render_cache.put(key, entry)
+    return entry
+
+
+def peek_render(data_version, params, format='png', dpi=None):
+    # 只查找缓存中的渲染结果, 未命中时返回 None (不渲染, 不计入命中统计)
+    key = render_key(data_version, params, format, dpi)
+    return _render_cache.get(key) if key in _render_cache else None
+
+
+def draft_params(params):
+    # 草图只保留图形本身: 关闭平滑、寻峰与回归, 'best' 图例位置 (需逐点搜索) 固定到右上角,
+    # 散点较多时改用密度图
+    if isinstance(params, PlotSpec):
+        params = params.to_dict()
+    draft = dict(params, enable_interp=False, enable_peaks=False, enable_linreg=False)
+    if draft.get('legend_loc', 'best') == 'best':
+        draft['legend_loc'] = 'upper right'
+    draft['density_threshold'] = min(draft.get('density_threshold', DRAFT_MIN_ROWS), DRAFT_MIN_ROWS)
+    return draft
+
+
+def draft_frame(df_plot, max_rows):
+    # 等间隔抽取行并保持原有顺序, 折线的走势与散点的分布大致不变
+    if len(df_plot) <= max_rows:
+        return df_plot
+    return df_plot.iloc[np.linspace(0, len(df_plot) - 1, max_rows).astype(np.intp)]
+
+
+def cached_draft(df_plot, data_version, params):
+    # 低分辨率草图, 返回 (PNG 字节, 渲染信息); 信息中的 'draft_rows' 为实际绘制的行数
+    # Matplotlib 的绘制无法中途打断, 时间预算通过调整下一次草图的抽样行数来满足
+    params = draft_params(params)
+    plot_type = params['plot_type']
+    limit = DRAFT_PER_ROW_ROWS if plot_type in PER_ROW_PLOT_TYPES else DRAFT_MAX_ROWS
+    rows = min(_draft_rows.get(plot_type, DRAFT_ROWS), limit)
+    version = f"{data_version}:draft:{rows}"
+    entry = peek_render(version, params, dpi=DRAFT_DPI)
+    if entry is None:
+        started = time.perf_counter()
+        image_bytes, info = render_plot(draft_frame(df_plot, rows), params, version, dpi=DRAFT_DPI, tight=False)
+        elapsed = time.perf_counter() - started
+        if elapsed > DRAFT_BUDGET:
+            _draft_rows[plot_type] = max(DRAFT_MIN_ROWS, rows // 2)
+        elif elapsed < DRAFT_BUDGET / 2:
+            _draft_rows[plot_type] = min(limit, rows * 2)
+        entry = (image_bytes, dict(info, draft_rows=min(rows, len(df_plot))))
+        _render_cache.put(render_key(version, params, 'png', DRAFT_DPI), entry)
+    return entry
+
+
+def render_cache_stats():
+    return _render_cache.stats()
@@ -0,0 +1,179 @@
+import numpy as np
+import pandas as pd
+
+from correlation import numeric_columns
+
+# 分页编辑器每页的行数
+PAGE_SIZES = [100, 500, 1000, 5000]
+
+
+def page_bounds(n_rows, page, page_size):
+    # 第 page 页 (从 1 开始) 的行范围 [start, stop)
+    start = min(max(page - 1, 0) * page_size, max(n_rows - 1, 0) // page_size * page_size)
+    return start, min(start + page_size, n_rows)
+
+
+def _widen(series, values):
+    # 新值超出列的类型范围 (如整数列写入小数、category 列写入新类别) 时放宽列类型
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        new = pd.Index(values).dropna().difference(series.cat.categories)
+        return series.cat.add_categories(new)
+    target = pd.Series(values).infer_objects().dtype
+    try:
+        return series.astype(np.result_type(series.dtype, target))
+    except TypeError:
+        return series.astype(object)
+
+
+def _set_values(df, col, positions, values):
+    # 原地写入一列中的若干行; 列数据只读 (数据集的内存映射) 或类型不兼容时只替换这一列
+    j = df.columns.get_loc(col)
+    if df[col].dtype.kind in 'iufc':
+        # 清空的单元格为 None, 数值列中记为 NaN
+        values = [np.nan if value is None else value for value in values]
+    try:
+        df.iloc[positions, j] = values
+    except ValueError as e:
+        if 'read-only' not in str(e):
+            raise
+        df[col] = df[col].copy()
+        df.iloc[positions, j] = values
+    except TypeError:
+        df[col] = _widen(df[col], values)
+        df.iloc[positions, j] = values
+
+
+def _add_categories(df, added_rows):
+    # 新增行带来的新类别先加入 category 列, 拼接后仍保持 category 类型
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            values = pd.Index([row.get(str(col)) for row in added_rows]).dropna()
+            new = values.difference(df[col].cat.categories)
+            if len(new):
+                df[col] = df[col].cat.add_categories(new)
+
+
+def _added_frame(df, added_rows):
+    # 新增行按原列类型构造, 整数索引接在现有最大值之后
+    added = pd.DataFrame([{col: row.get(str(col)) for col in df.columns} for row in added_rows], columns=df.columns)
+    for col in df.columns:
+        try:
+            added[col] = added[col].astype(df[col].dtype)
+        except (TypeError, ValueError):
+            pass
+    if pd.api.types.is_integer_dtype(df.index.dtype):
+        start = df.index.max() + 1 if len(df) else 0
+        added.index = pd.RangeIndex(start, start + len(added))
+    return added
+
+
+def apply_editor_delta(df, start, delta, inplace=False, stop=None):
+    # 把 st.data_editor 的编辑状态应用到整张表:
+    #   {'edited_rows': {行位置: {列名: 新值}}, 'added_rows': [{列名: 值}], 'deleted_rows': [行位置]}
+    # 行位置相对于当前页的起始行 start; 单元格修改原地写入, 只复制被修改的列
+    # 新增行插入在当前页的末尾 (编辑前的行位置 stop 处, None 为表末尾), 变更中的 'added_position' 为插入后的位置
+    # inplace=False 时先浅拷贝, 不影响与其他会话共享的原表
+    # 返回 (新表, 变更), 变更为 None 表示没有修改; 变更中的行数组对应编辑前的数值列, 用于增量更新相关性统计量
+    # 变更同时记录被覆盖的单元格原值、被删除的行与编辑前的列类型, 足以撤销这次编辑 (见 revert_delta)
+    edited_rows = delta.get('edited_rows') or {}
+    deleted = sorted({start + int(pos) for pos in delta.get('deleted_rows') or []})
+    added_rows = delta.get('added_rows') or []
+    if not (edited_rows or deleted or added_rows):
+        return df, None
+
+    names = {str(col): col for col in df.columns}
+    columns = numeric_columns(df)
+    col_positions = [df.columns.get_loc(col) for col in columns]
+
+    # 按列收集修改: 列名 -> (行位置, 新值)
+    cell_edits = {}
+    for pos, cells in edited_rows.items():
+        row = start + int(pos)
+        for name, value in cells.items():
+            if name in names:
+                rows, values = cell_edits.setdefault(names[name], ([], []))
+                rows.append(row)
+                values.append(value)
+    deleted_set = set(deleted)
+    edited = sorted({row for rows, _ in cell_edits.values() for row in rows} - deleted_set)
+
+    def numeric_rows(frame, rows):
+        return frame.iloc[rows, col_positions].to_numpy(dtype=float, na_value=np.nan)
+
+    old_rows = numeric_rows(df, edited)
+    removed_rows = numeric_rows(df, deleted)
+    old_cells = {col: (rows, df.iloc[rows, df.columns.get_loc(col)].tolist()) for col, (rows, _) in cell_edits.items()}
+    removed_frame = df.iloc[deleted].copy()
+    dtypes = df.dtypes
+
+    if not inplace:
+        # pandas 3 的写时复制保证之后的写入只复制被修改的列, 不影响原表
+        df = df.copy(deep=False)
+    _add_categories(df, added_rows)
+    for col, (rows, values) in cell_edits.items():
+        _set_values(df, col, rows, values)
+    new_positions = np.arange(len(df))
+    if deleted:
+        # 按位置删除, 索引有重复值时也只删除选中的行
+        keep = np.ones(len(df), dtype=bool)
+        keep[deleted] = False
+        new_positions[keep] = np.arange(keep.sum())
+        df = df[keep]
+    # 删除行之后的插入位置
+    insert_at = len(df)
+    if stop is not None:
+        insert_at = min(stop - sum(1 for row in deleted if row < stop), len(df))
+    if added_rows:
+        added = _added_frame(df, added_rows)
+        if not len(df):
+            df = added
+        elif insert_at == len(df):
+            df = pd.concat([df, added])
+        else:
+            df = pd.concat([df.iloc[:insert_at], added, df.iloc[insert_at:]])
+            new_positions[new_positions >= insert_at] += len(added_rows)
+
+    # 修改改变了数值列 (如数值列写入文本) 时不提供行数组, 相关性统计量下次全量计算
+    if numeric_columns(df) == columns:
+        new_rows = numeric_rows(df, new_positions[edited])
+        added_values = numeric_rows(df, list(range(insert_at, insert_at + len(added_rows))))
+    else:
+        old_rows = new_rows = removed_rows = added_values = None
+
+    changes = {
+        'columns': columns,
+        'old_rows': old_rows, 'new_rows': new_rows,
+        'removed_rows': removed_rows, 'added_rows': added_values,
+        'touched': [col for col in columns if col in cell_edits],
+        'edited': sum(len(rows) for rows, _ in cell_edits.values()),
+        'deleted': len(deleted), 'added': len(added_rows), 'added_position': insert_at,
+        'old_cells': old_cells, 'dtypes': dtypes,
+        'deleted_positions': deleted, 'removed_frame': removed_frame
+    }
+    return df, changes
+
+
+def revert_delta(df, changes):
+    # 撤销一次编辑 (apply_editor_delta 返回的变更): 依次去掉新增行、放回删除的行、恢复被修改的单元格与列类型
+    # 没有增删行时原地修改 df
+    if changes['added']:
+        keep = np.ones(len(df), dtype=bool)
+        keep[changes['added_position']:changes['added_position'] + changes['added']] = False
+        df = df[keep]
+    positions = changes['deleted_positions']
+    if positions:
+        removed = changes['removed_frame']
+        n = len(df) + len(removed)
+        restored = np.zeros(n, dtype=bool)
+        restored[positions] = True
+        order = np.empty(n, dtype=np.intp)
+        order[~restored] = np.arange(len(df))
+        order[restored] = len(df) + np.arange(len(removed))
+        df = pd.concat([df, removed]).iloc[order]
+    for col, (rows, values) in changes['old_cells'].items():
+        _set_values(df, col, rows, values)
+    # 编辑中被放宽的列 (整数列写入小数、新增类别等) 在恢复原值后转换回原类型
+    for col, dtype in changes['dtypes'].items():
+        if df[col].dtype != dtype:
+            df[col] = df[col].astype(dtype)
+    return df
@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import ColumnAggregates, column_aggregates, selection_stats
+
+
+def test_index_is_a_snapshot():
+    # 数据表原地修改后, 已建立的索引仍与建立时的数据一致 (前缀和与排序值不互相矛盾)
+    df = pd.DataFrame({'a': np.arange(100.0)})
+    before = selection_stats(df, [0, 1, 2, 50], ['a'], 'v')
+    df.iloc[1, 0] = 1000.0
+    after = selection_stats(df, [0, 1, 2, 50], ['a'], 'v')
+    assert after == before
+    agg = column_aggregates(df, 'a', 'v')
+    assert agg.sorted_values()[-1] == 99.0
+    assert agg.range_moments(0, 100)[4] == 99.0
+
+
+def test_index_arrays_are_read_only():
+    agg = ColumnAggregates(pd.Series([1.0, np.nan, 3.0]))
+    agg.sorted_values()
+    for name in ('values', 'prefix_null', 'prefix_sum', 'prefix_sq', 'block_min', 'block_max', '_sorted'):
+        with pytest.raises(ValueError):
+            getattr(agg, name)[0] = 0
+
+
+def test_memory_mapped_column_not_copied(tmp_path):
+    path = tmp_path / 'a.npy'
+    np.save(path, np.arange(10.0))
+    df = pd.DataFrame({'a': np.load(path, mmap_mode='r')}, copy=False)
+    agg = ColumnAggregates(df['a'])
+    assert not agg._owns_values
+    assert agg.nbytes == sum(getattr(agg, name).nbytes for name in ('prefix_sum', 'prefix_sq', 'block_min', 'block_max'))
+
+
+def _mixed_frame(n=5000, seed=0):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'f': rng.normal(100.0, 5.0, n),
+        'i': rng.integers(-50, 50, n),
+        'f32': rng.random(n).astype(np.float32),
+        'n': pd.array(rng.integers(0, 9, n), dtype='Int64'),
+        't': rng.choice(['x', 'y', None], n),
+    })
+    df.loc[rng.choice(n, 300, replace=False), 'f'] = np.nan
+    df.loc[rng.choice(n, 200, replace=False), 'n'] = pd.NA
+    return df
+
+
+def _selections(n, rng):
+    return {
+        'all': None,
+        'run': list(range(1000, 3100)),
+        'runs': [r for start in (0, 1500, 4090) for r in range(start, min(start + 300, n))],
+        'scattered': np.sort(rng.choice(n, 700, replace=False)).tolist(),
+        'unsorted': rng.integers(0, n, 400).tolist(),
+    }
+
+
+@pytest.mark.parametrize('cols', [['f'], ['i', 'f32'], ['f', 'i', 'f32', 'n', 't']])
+def test_selection_stats_match_describe(cols):
+    # 选区内所有数值单元格合在一起与 pandas describe() 的结果一致
+    df = _mixed_frame()
+    rng = np.random.default_rng(1)
+    for name, rows in _selections(len(df), rng).items():
+        stats = selection_stats(df, rows, cols, data_version='mixed')
+        selected = df[cols] if rows is None else df[cols].iloc[sorted(set(rows))]
+        numeric = [col for col in cols if col != 't']
+        cells = pd.concat([selected[col].astype('float64') for col in numeric], ignore_index=True)
+        expected = cells.describe()
+        assert stats['rows'] == len(selected), name
+        assert stats['empty'] == int(selected.isna().sum().sum()), name
+        assert stats['count'] == expected['count'], name
+        assert stats['mean'] == pytest.approx(expected['mean'], rel=1e-9), name
+        assert stats['sum'] == pytest.approx(cells.sum(), rel=1e-9), name
+        assert stats['median'] == pytest.approx(expected['50%']), name
+        assert stats['min'] == pytest.approx(expected['min']), name
+        assert stats['max'] == pytest.approx(expected['max']), name
+        # describe() 的标准差为样本标准差, var 为总体方差
+        count = expected['count']
+        assert np.sqrt(stats['var'] * count / (count - 1)) == pytest.approx(expected['std'], rel=1e-6), name
+
+
+def test_selection_stats_with_infinite_values():
+    df = pd.DataFrame({'a': [1.0, np.inf, 3.0, np.nan, -np.inf, 2.0]})
+    stats = selection_stats(df, [0, 2, 5], ['a'], data_version='inf')
+    assert (stats['count'], stats['min'], stats['max'], stats['median']) == (3, 1.0, 3.0, 2.0)
+    stats = selection_stats(df, None, ['a'], data_version='inf')
+    assert stats['count'] == 5 and stats['max'] == np.inf and stats['min'] == -np.inf
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation import BLOCK_ROWS, CorrelationStats, correlation_stats, update_correlation_rows
+from table_editor import apply_editor_delta
+
+
+def test_nullable_columns_match_pandas():
+    # 可空整数/浮点列中的 pd.NA 与 NaN 一样按成对删除处理
+    df = pd.DataFrame({
+        'a': pd.array([1, 2, None, 4, 5, 7], dtype='Int64'),
+        'b': pd.array([1.0, None, 3.5, 3.0, 6.0, 2.0], dtype='Float64'),
+        'c': [1.0, 2.0, 3.0, 5.0, np.nan, 4.0],
+    })
+    stats = CorrelationStats.from_frame(df)
+    expected = df.astype('float64').corr().to_numpy()
+    np.testing.assert_allclose(stats.matrix(), expected, rtol=1e-5, atol=1e-6)
+
+
+def _frame_with_nans(n=500, seed=0):
+    rng = np.random.default_rng(seed)
+    base = rng.normal(size=n)
+    df = pd.DataFrame({
+        'a': base + rng.normal(scale=0.5, size=n),
+        'b': -base + rng.normal(scale=2.0, size=n),
+        'c': rng.normal(size=n).astype(np.float32),
+        'd': rng.integers(0, 10, n),
+        'e': 1e6 + base,
+    })
+    for col in ('a', 'b', 'c'):
+        df.loc[rng.choice(n, 40, replace=False), col] = np.nan
+    return df
+
+
+@pytest.mark.parametrize('block_rows', [64, BLOCK_ROWS])
+def test_matrix_matches_pandas_with_nans(block_rows):
+    df = _frame_with_nans()
+    stats = CorrelationStats.from_frame(df, block_rows=block_rows)
+    np.testing.assert_allclose(stats.matrix(), df.corr().to_numpy(), rtol=1e-4, atol=1e-5)
+
+
+def test_constant_and_empty_columns():
+    df = pd.DataFrame({'a': [1.0, 2.0, 3.0, 4.0], 'k': [5.0] * 4, 'n': [np.nan] * 4, 'b': [2.0, 1.0, 4.0, 3.0]})
+    np.testing.assert_allclose(CorrelationStats.from_frame(df).matrix(), df.corr().to_numpy(), atol=1e-6)
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_incremental_update_matches_pandas(seed):
+    # 表格编辑器的增量 (修改、删除、新增行, 含写入与清除缺失值) 更新后与全量计算一致
+    rng = np.random.default_rng(seed)
+    df = _frame_with_nans(seed=seed)[['a', 'b', 'c', 'e']]
+    version = f'v{seed}-0'
+    correlation_stats(df, version)
+    for step in range(1, 6):
+        start = int(rng.integers(0, len(df) - 50))
+        delta = {
+            'edited_rows': {int(r): {str(rng.choice(['a', 'b', 'c', 'e'])): [float(rng.normal()), None][rng.integers(0, 2)]}
+                            for r in rng.integers(0, 50, 5)},
+            'deleted_rows': sorted(set(rng.integers(0, 50, 2).tolist())),
+            'added_rows': [{'a': float(rng.normal()), 'b': 0.5}, {'c': 1.0, 'e': 2.0}],
+        }
+        new_df, changes = apply_editor_delta(df, start, delta, stop=start + 50)
+        new_version = f'v{seed}-{step}'
+        stats = update_correlation_rows(new_df, version, new_version, changes['columns'], changes['old_rows'],
+                                        changes['new_rows'], changes['removed_rows'], changes['added_rows'],
+                                        changes['touched'])
+        assert stats is not None
+        np.testing.assert_allclose(stats.matrix(), new_df.corr().to_numpy(), rtol=1e-4, atol=1e-4)
+        df, version = new_df, new_version
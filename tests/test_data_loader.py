@@ -0,0 +1,32 @@
+import io
+
+import numpy as np
+import pandas as pd
+
+from data_loader import compact_frame, read_csv_chunked
+
+
+def _csv(df):
+    return io.BytesIO(df.to_csv(index=False).encode('utf-8'))
+
+
+def test_chunked_read_matches_full_read():
+    # 前面的块推断为数字、后面的块出现文本的列, 分块读取的结果与整体读取一致
+    n = 5000
+    rng = np.random.default_rng(0)
+    codes = ['0%d' % (1000 + i % 50) for i in range(n)]
+    codes[-1] = 'A1'
+    source = pd.DataFrame({
+        'flag': ['1'] * 4900 + ['x' if i % 2 else '1' for i in range(100)],
+        'code': codes,
+        'late_text': [''] * 4000 + ['q'] * 1000,
+        'value': rng.random(n).round(3),
+        'count': np.arange(n),
+    })
+    df, report = read_csv_chunked(_csv(source), chunksize=500)
+    expected = compact_frame(pd.read_csv(_csv(source)))
+    assert report['rows'] == n
+    assert df.dtypes.to_dict() == expected.dtypes.to_dict()
+    for col in df.columns:
+        assert df[col].astype(object).equals(expected[col].astype(object)), col
+    assert df['flag'].value_counts().to_dict() == {'1': 4950, 'x': 50}
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from aggregates import selection_stats
+from dataset import VersionedDataset
+
+
+def _expected(df, rows, col):
+    values = df[col] if rows is None else df[col].iloc[rows]
+    return {'count': values.count(), 'sum': values.sum(), 'median': values.median(),
+            'min': values.min(), 'max': values.max()}
+
+
+def _check(ds, rows, col='a'):
+    stats = selection_stats(ds.frame, rows, [col], ds.version)
+    for name, value in _expected(ds.frame, rows, col).items():
+        assert stats[name] == pytest.approx(value), name
+
+
+@pytest.mark.parametrize('delta', [
+    {'edited_rows': {1: {'a': 100.0}}},
+    {'edited_rows': {1: {'a': 100.0}}, 'added_rows': [{'a': 5.0}]},
+    {'edited_rows': {1: {'a': 100.0}}, 'deleted_rows': [3]},
+])
+def test_undo_redo_selection_stats(delta):
+    # 原地修改单元格后撤销, 旧版本号对应的统计量不能来自被修改过的数据
+    ds = VersionedDataset(pd.DataFrame({'a': np.arange(10.0)}))
+    for rows in ([0, 1, 2], [0, 2, 4], None):
+        _check(ds, rows)
+    ds.apply_edits(0, delta)
+    _check(ds, [0, 1, 2])
+    ds.undo()
+    assert ds.version.endswith('-0')
+    for rows in ([0, 1, 2], [0, 2, 4], None):
+        _check(ds, rows)
+    ds.redo()
+    for rows in ([0, 1, 2], [0, 2, 4], None):
+        _check(ds, rows)
+
+
+def test_undo_restores_frame():
+    df = pd.DataFrame({'a': np.arange(6.0), 'b': np.arange(6), 'c': pd.Categorical(list('xyxyxy'))})
+    original = df.copy()
+    ds = VersionedDataset(df, shared=True)
+    ds.apply_edits(2, {'edited_rows': {0: {'a': -1.0, 'b': 2.5, 'c': 'z'}}, 'added_rows': [{'a': 9.0}],
+                       'deleted_rows': [1]}, stop=4)
+    ds.apply_edits(0, {'edited_rows': {0: {'a': 7.0}}})
+    while ds.undo():
+        pass
+    pd.testing.assert_frame_equal(ds.frame, original)
+    # 共享的原表不被修改
+    pd.testing.assert_frame_equal(df, original)
@@ -0,0 +1,60 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from table_editor import apply_editor_delta, page_bounds, revert_delta
+
+
+def _frame(n=60):
+    rng = np.random.default_rng(0)
+    return pd.DataFrame({
+        'f': rng.random(n),
+        'i': np.arange(n, dtype=np.int64),
+        'f32': rng.random(n).astype(np.float32),
+        'c': pd.Categorical(rng.choice(['x', 'y'], n)),
+        's': [f's{k}' for k in range(n)],
+    })
+
+
+def _random_delta(rng, page_rows, step):
+    delta = {'edited_rows': {}, 'added_rows': [], 'deleted_rows': []}
+    for _ in range(3):
+        col = str(rng.choice(['f', 'i', 'f32', 'c', 's']))
+        value = {'f': [float(rng.random()), None][rng.integers(0, 2)], 'i': [int(rng.integers(0, 9)), 2.5][rng.integers(0, 2)],
+                 'f32': float(rng.random()), 'c': ['x', f'new{step}'][rng.integers(0, 2)], 's': f'e{step}'}[col]
+        delta['edited_rows'].setdefault(int(rng.integers(0, page_rows)), {})[col] = value
+    delta['deleted_rows'] = sorted(set(rng.integers(0, page_rows, 2).tolist()))
+    delta['added_rows'] = [{'f': 1.5, 'c': f'add{step}'}, {'i': 7}]
+    return delta
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_apply_revert_round_trip(seed):
+    # 分页编辑 (修改、删除、新增行) 若干次后逐步撤销, 每一步都回到该次编辑前的表
+    rng = np.random.default_rng(seed)
+    df = _frame()
+    history = [df.copy()]
+    log = []
+    for step in range(6):
+        start, stop = page_bounds(len(df), int(rng.integers(1, 5)), 20)
+        df, changes = apply_editor_delta(df, start, _random_delta(rng, stop - start, step), inplace=True, stop=stop)
+        assert len(df) == len(history[-1]) - changes['deleted'] + changes['added']
+        history.append(df.copy())
+        log.append(changes)
+    for step in range(5, -1, -1):
+        df = revert_delta(df, log[step])
+        pd.testing.assert_frame_equal(df, history[step])
+
+
+def test_added_rows_inserted_at_page_end():
+    df = _frame(50)
+    start, stop = page_bounds(len(df), 2, 20)
+    delta = {'edited_rows': {0: {'f': -1.0}}, 'added_rows': [{'i': -5}], 'deleted_rows': [1]}
+    new, changes = apply_editor_delta(df, start, delta, stop=stop)
+    # 删除第 21 行后, 本页最后一行 (原第 40 行) 位于 38, 新增行紧随其后
+    assert changes['added_position'] == stop - 1
+    assert new['i'].iloc[stop - 1] == -5
+    assert new['i'].iloc[stop - 2] == 39
+    assert new['f'].iloc[start] == -1.0
+    # 原表不受影响
+    pd.testing.assert_frame_equal(df, _frame(50))